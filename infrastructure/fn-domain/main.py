@@ -8,23 +8,80 @@ As well as creating a SMStudio domain, this implementation:
 """
 
 # Python Built-Ins:
+from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
+import os
+import threading
 import time
 import traceback
 
 # External Dependencies:
-import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import WaiterError
+from botocore.waiter import WaiterModel, create_waiter_with_client
 import cfnresponse
 
 # Local Dependencies:
 import vpctools
 
-ec2 = boto3.client("ec2")
-smclient = boto3.client("sagemaker")
+# Clients are created once per container during Lambda init, sharing vpctools' botocore session & config:
+smclient = vpctools.session.create_client("sagemaker", config=vpctools.client_config)
+lambdaclient = vpctools.session.create_client("lambda", config=vpctools.client_config)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+# Leave this much of the Lambda's time budget spare after polling, to report results back to CloudFormation:
+TIMEOUT_MARGIN_SECS = 30
+# ...And if the handler is still running with only this much time left, report failure straight away:
+WATCHDOG_MARGIN_SECS = 10
+# Max number of times to re-invoke the Lambda to keep waiting on a slow domain operation (CloudFormation
+# itself will only wait 1hr for the resource, so there's no point going beyond ~4x 15min invocations):
+MAX_CONTINUATIONS = 3
+# Re-use default VPC/subnet discovery results from warm invocations up to this old:
+VPC_CACHE_TTL_SECS = 300
+
+# SageMaker doesn't publish waiters for Studio domains, so we define our own. Polling cadence is set by
+# 'delay' here, while the number of attempts is further limited by the Lambda's remaining execution time.
+DOMAIN_WAITER_MODEL = WaiterModel({
+    "version": 2,
+    "waiters": {
+        "DomainInService": {
+            "operation": "DescribeDomain",
+            "delay": 2,
+            "maxAttempts": 450,  # (Enough for a whole 15min Lambda timeout)
+            "acceptors": [
+                { "matcher": "path", "argument": "Status", "expected": "InService", "state": "success" },
+                # A just-created domain may not be visible to DescribeDomain straight away:
+                { "matcher": "error", "expected": "ResourceNotFound", "state": "retry" },
+                { "matcher": "path", "argument": "Status", "expected": "Failed", "state": "failure" },
+                { "matcher": "path", "argument": "Status", "expected": "Update_Failed", "state": "failure" },
+                { "matcher": "path", "argument": "Status", "expected": "Delete_Failed", "state": "failure" },
+            ],
+        },
+        "DomainDeleted": {
+            "operation": "DescribeDomain",
+            "delay": 2,
+            "maxAttempts": 450,  # (Enough for a whole 15min Lambda timeout)
+            "acceptors": [
+                { "matcher": "error", "expected": "ResourceNotFound", "state": "success" },
+                { "matcher": "path", "argument": "Status", "expected": "Delete_Failed", "state": "failure" },
+            ],
+        },
+    },
+})
+
 
 def lambda_handler(event, context):
+    # If the Lambda gets killed by timeout before responding, CloudFormation would wait a full hour before
+    # failing the stack - so make sure we always send *something* back before that happens:
+    watchdog = threading.Timer(
+        context.get_remaining_time_in_millis() / 1000 - WATCHDOG_MARGIN_SECS,
+        handle_timeout,
+        args=(event, context),
+    )
+    watchdog.daemon = True
+    watchdog.start()
     try:
         request_type = event["RequestType"]
         if request_type == "Create":
@@ -42,7 +99,7 @@ def lambda_handler(event, context):
                 error=f"Unsupported CFN RequestType '{request_type}'",
             )
     except Exception as e:
-        logging.error("Uncaught exception in CFN custom resource handler - reporting failure")
+        logger.error("Uncaught exception in CFN custom resource handler - reporting failure")
         traceback.print_exc()
         cfnresponse.send(
             event,
@@ -52,37 +109,51 @@ def lambda_handler(event, context):
             error=str(e),
         )
         raise e
+    finally:
+        watchdog.cancel()
+
+
+def handle_timeout(event, context):
+    logger.error("Lambda about to time out before handler completed - reporting failure")
+    cfnresponse.send(
+        event,
+        context,
+        cfnresponse.FAILED,
+        {},
+        # Create continuations have no PhysicalResourceId yet, but must still report the created domain's ID
+        # so that CloudFormation's rollback Delete can clean it up:
+        physicalResourceId=(
+            event.get("PhysicalResourceId") or event.get("CallbackContext", {}).get("DomainId")
+        ),
+        error="Approaching Lambda timeout",
+    )
 
 
 def handle_create(event, context):
-    logging.info("**Received create request")
+    logger.info("**Received create request")
     resource_config = event["ResourceProperties"]
 
-    # We split out pre- and post-processing because we'd like to always report our correct physicalResourceId
-    # if erroring out after the actual creation, so that the subsequent deletion request can clean up.
-    logging.info("**Preparing studio domain creation parameters")
-    create_domain_args = preprocess_create_domain_args(resource_config)
-    logging.info("**Creating studio domain")
-    creation = smclient.create_domain(**create_domain_args)
-    _, _, domain_id = creation["DomainArn"].rpartition("/")
+    if "CallbackContext" in event:
+        # The domain was already created by a previous invocation, which ran out of time waiting for it:
+        domain_id = event["CallbackContext"]["DomainId"]
+        logger.info("**Resuming wait for studio domain %s", domain_id)
+    else:
+        # We split out pre- and post-processing because we'd like to always report our correct
+        # physicalResourceId if erroring out after the actual creation, so that the subsequent deletion
+        # request can clean up.
+        logger.info("**Preparing studio domain creation parameters")
+        create_domain_args = preprocess_create_domain_args(resource_config)
+        logger.info("**Creating studio domain")
+        creation = smclient.create_domain(**create_domain_args)
+        _, _, domain_id = creation["DomainArn"].rpartition("/")
     try:
-        result = post_domain_create(domain_id)
-        domain_desc = result["DomainDescription"]
-        response = {
-            "DomainId": domain_desc["DomainId"],
-            "DomainName": domain_desc["DomainName"],
-            "HomeEfsFileSystemId": domain_desc["HomeEfsFileSystemId"],
-            "SubnetIds": ",".join(domain_desc["SubnetIds"]),
-            "Url": domain_desc["Url"],
-            "VpcId": domain_desc["VpcId"],
-            "ProposedAdminSubnetCidr": result["ProposedAdminSubnetCidr"],
-            "InboundEFSSecurityGroupId": result["InboundEFSSecurityGroupId"],
-            "OutboundEFSSecurityGroupId": result["OutboundEFSSecurityGroupId"],
-        }
-        print(response)
+        if not wait_or_continue(event, context, "DomainInService", domain_id):
+            return
+        response = post_domain_create(domain_id)
+        logger.info("Domain creation response: %s", response)
         cfnresponse.send(event, context, cfnresponse.SUCCESS, response, physicalResourceId=domain_id)
     except Exception as e:
-        logging.error("Uncaught exception in post-creation processing")
+        logger.error("Uncaught exception in post-creation processing")
         traceback.print_exc()
         cfnresponse.send(
             event,
@@ -95,7 +166,7 @@ def handle_create(event, context):
 
 
 def handle_delete(event, context):
-    logging.info("**Received delete event")
+    logger.info("**Received delete event")
     domain_id = event["PhysicalResourceId"]
     try:
         smclient.describe_domain(DomainId=domain_id)
@@ -109,8 +180,12 @@ def handle_delete(event, context):
             physicalResourceId=event["PhysicalResourceId"],
         )
         return
-    logging.info("**Deleting studio domain")
-    delete_domain(domain_id)
+    if "CallbackContext" not in event:
+        logger.info("**Deleting studio domain")
+        delete_domain(domain_id)
+    if not wait_or_continue(event, context, "DomainDeleted", domain_id):
+        return
+    logger.info("Deleted domain %s", domain_id)
     cfnresponse.send(
         event,
         context,
@@ -121,12 +196,14 @@ def handle_delete(event, context):
 
 
 def handle_update(event, context):
-    logging.info("**Received update event")
+    logger.info("**Received update event")
     domain_id = event["PhysicalResourceId"]
     default_user_settings = event["ResourceProperties"]["DefaultUserSettings"]
-    logging.info("**Updating studio domain")
-    update_domain(domain_id, default_user_settings)
-    # TODO: Should we wait here for the domain to enter active state again?
+    if "CallbackContext" not in event:
+        logger.info("**Updating studio domain")
+        update_domain(domain_id, default_user_settings)
+    if not wait_or_continue(event, context, "DomainInService", domain_id):
+        return
     cfnresponse.send(
         event,
         context,
@@ -144,20 +221,28 @@ def preprocess_create_domain_args(config):
 
     if not vpc_id:
         # Try to look up the default VPC ID:
-        # TODO: NextToken handling on this list API?
-        available_vpcs = ec2.describe_vpcs()["Vpcs"]
-        if len(available_vpcs) <= 0:
-            raise ValueError("No default VPC exists - cannot create SageMaker Studio Domain")
-
-        default_vpcs = list(filter(lambda v: v["IsDefault"], available_vpcs))
+        default_vpcs = vpctools.describe_all(
+            "describe_vpcs",
+            "Vpcs",
+            cache_ttl_secs=VPC_CACHE_TTL_SECS,
+            Filters=[{ "Name": "is-default", "Values": ["true"] }],
+        )
         if len(default_vpcs) == 1:
             vpc = default_vpcs[0]
         elif len(default_vpcs) > 1:
             raise ValueError("'VPC' not specified in config, and multiple default VPCs found")
         else:
-            if len(available_vpcs) == 1:
+            # Only need the full VPC listing when there's no default to use:
+            available_vpcs = vpctools.describe_all(
+                "describe_vpcs",
+                "Vpcs",
+                cache_ttl_secs=VPC_CACHE_TTL_SECS,
+            )
+            if len(available_vpcs) <= 0:
+                raise ValueError("No default VPC exists - cannot create SageMaker Studio Domain")
+            elif len(available_vpcs) == 1:
                 vpc = available_vpcs[0]
-                logging.warning(f"Found exactly one (non-default) VPC: Using {vpc['VpcId']}")
+                logger.warning("Found exactly one (non-default) VPC: Using %s", vpc["VpcId"])
             else:
                 raise ValueError(
                     "'VPC' not specified in config, and multiple VPCs found with no 'default' VPC"
@@ -165,19 +250,25 @@ def preprocess_create_domain_args(config):
         vpc_id = vpc["VpcId"]
 
     if not subnet_ids:
-        # Use all the subnets
-        # TODO: NextToken handling on this list API?
-        available_subnets = ec2.describe_subnets(
-            Filters=[{
-                "Name": "vpc-id",
-                "Values": [vpc_id],
-            }],
-        )["Subnets"]
-        default_subnets = list(filter(lambda n: n["DefaultForAz"], available_subnets))
+        # Use the VPC's default subnets if there are any, or else all the subnets:
+        vpc_filter = { "Name": "vpc-id", "Values": [vpc_id] }
         subnet_ids = [
-            n["SubnetId"] for n in
-            (default_subnets if len(default_subnets) > 0 else available_subnets)
+            n["SubnetId"] for n in vpctools.describe_all(
+                "describe_subnets",
+                "Subnets",
+                cache_ttl_secs=VPC_CACHE_TTL_SECS,
+                Filters=[vpc_filter, { "Name": "default-for-az", "Values": ["true"] }],
+            )
         ]
+        if not subnet_ids:
+            subnet_ids = [
+                n["SubnetId"] for n in vpctools.describe_all(
+                    "describe_subnets",
+                    "Subnets",
+                    cache_ttl_secs=VPC_CACHE_TTL_SECS,
+                    Filters=[vpc_filter],
+                )
+            ]
     elif isinstance(subnet_ids, str):
         subnet_ids = subnet_ids.split(",")
 
@@ -190,28 +281,26 @@ def preprocess_create_domain_args(config):
     }
 
 def post_domain_create(domain_id):
-    created = False
-    time.sleep(0.2)
-    while not created:
-        description = smclient.describe_domain(DomainId=domain_id)
-        status_lower = description["Status"].lower()
-        if status_lower == "inservice":
-            created = True
-            break
-        elif "fail" in status_lower:
-            raise ValueError(
-                f"Domain {domain_id} entered failed status"
-            )
-        time.sleep(5)
-    logging.info("**SageMaker domain created successfully: %s", domain_id)
+    description = smclient.describe_domain(DomainId=domain_id)
+    logger.info("**SageMaker domain created successfully: %s", domain_id)
 
     vpc_id = description["VpcId"]
-    # Retrieve the VPC security groups set up by SageMaker for EFS communication:
-    inbound_efs_sg_id, outbound_efs_sg_id = vpctools.get_studio_efs_security_group_ids(domain_id, vpc_id)
-    # Propose a valid subnet to create in this VPC for managing further setup actions:
-    proposed_admin_subnet = vpctools.propose_subnet(vpc_id)
+    # These two VPC lookups are independent, so run them concurrently to save EC2 API round trips:
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        # Retrieve the VPC security groups set up by SageMaker for EFS communication:
+        efs_sgs_future = executor.submit(vpctools.get_studio_efs_security_group_ids, domain_id, vpc_id)
+        # Propose a valid subnet to create in this VPC for managing further setup actions:
+        proposed_admin_subnet_future = executor.submit(vpctools.propose_subnet, vpc_id)
+        inbound_efs_sg_id, outbound_efs_sg_id = efs_sgs_future.result()
+        proposed_admin_subnet = proposed_admin_subnet_future.result()
+    # Return only the fields we output to CloudFormation, rather than the whole domain description:
     return {
-        "DomainDescription": description,
+        "DomainId": description["DomainId"],
+        "DomainName": description["DomainName"],
+        "HomeEfsFileSystemId": description["HomeEfsFileSystemId"],
+        "SubnetIds": ",".join(description["SubnetIds"]),
+        "Url": description["Url"],
+        "VpcId": vpc_id,
         "ProposedAdminSubnetCidr": proposed_admin_subnet["CidrBlock"],
         "InboundEFSSecurityGroupId": inbound_efs_sg_id,
         "OutboundEFSSecurityGroupId": outbound_efs_sg_id,
@@ -225,16 +314,6 @@ def delete_domain(domain_id):
             "HomeEfsFileSystem": "Delete"
         },
     )
-    deleted = False
-    time.sleep(0.2)
-    while not deleted:
-        try:
-            smclient.describe_domain(DomainId=domain_id)
-        except smclient.exceptions.ResourceNotFound:
-            logging.info(f"Deleted domain {domain_id}")
-            deleted = True
-            break
-        time.sleep(5)
     return response
 
 
@@ -243,13 +322,67 @@ def update_domain(domain_id, default_user_settings):
         DomainId=domain_id,
         DefaultUserSettings=default_user_settings,
     )
-    updated = False
-    time.sleep(0.2)
-    while not updated:
-        response = smclient.describe_domain(DomainId=domain_id)
-        if response["Status"] == "InService":
-            updated = True
-        else:
-            logging.info("Updating domain %s.. %s", domain_id, response["Status"])
-        time.sleep(5)
     return response
+
+
+def get_deadline(context):
+    """Calculate a time.monotonic() deadline for polling, leaving TIMEOUT_MARGIN_SECS spare in the Lambda"""
+    return time.monotonic() + context.get_remaining_time_in_millis() / 1000 - TIMEOUT_MARGIN_SECS
+
+
+def wait_for_domain(waiter_name, domain_id, deadline):
+    """Wait for a domain using one of the DOMAIN_WAITER_MODEL waiters, giving up by `deadline`
+
+    Raises TimeoutError if the domain doesn't reach the target state before `deadline` (a time.monotonic()
+    value), or ValueError if it enters a failed state.
+    """
+    waiter = create_waiter_with_client(waiter_name, DOMAIN_WAITER_MODEL, smclient)
+    max_attempts = min(
+        waiter.config.max_attempts,
+        max(1, int((deadline - time.monotonic()) // waiter.config.delay)),
+    )
+    try:
+        waiter.wait(DomainId=domain_id, WaiterConfig={ "MaxAttempts": max_attempts })
+    except WaiterError as e:
+        reason = e.kwargs.get("reason", "")
+        if reason.startswith("Max attempts exceeded"):
+            raise TimeoutError(f"Ran out of time waiting for domain {domain_id} ({waiter_name})") from e
+        elif reason.startswith("Waiter encountered a terminal failure state"):
+            raise ValueError(f"Domain {domain_id} entered failed status") from e
+        raise e
+
+
+def wait_or_continue(event, context, waiter_name, domain_id):
+    """Wait for a domain per wait_for_domain(), or hand off to a new invocation if this one runs out of time
+
+    Studio domain operations can outlast a single Lambda execution, so when the time budget runs out we
+    re-invoke this function asynchronously with a 'CallbackContext' on the event to carry on waiting. Handlers
+    should skip their initial create/update/delete API call when CallbackContext is present.
+
+    Returns
+    -------
+    done : bool
+        True if the wait completed, or False if it has been passed on to a new invocation - in which case
+        the caller should return without responding to CloudFormation.
+
+    Raises
+    ------
+    TimeoutError :
+        If the wait timed out and MAX_CONTINUATIONS has already been reached.
+    """
+    n_continuations = event.get("CallbackContext", {}).get("Continuations", 0)
+    try:
+        wait_for_domain(waiter_name, domain_id, get_deadline(context))
+        return True
+    except TimeoutError:
+        if n_continuations >= MAX_CONTINUATIONS:
+            raise
+    logger.info("**Domain %s not ready yet - continuing wait in a new invocation", domain_id)
+    next_event = dict(event)
+    next_event["CallbackContext"] = { "DomainId": domain_id, "Continuations": n_continuations + 1 }
+    lambdaclient.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType="Event",
+        Payload=json.dumps(next_event),
+    )
+    return False
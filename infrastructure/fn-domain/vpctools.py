@@ -2,12 +2,50 @@
 
 # Python Built-Ins:
 import ipaddress
+import json
+import time
 from typing import List, Tuple, Union
 
 # External Dependencies:
-import boto3
+from botocore.config import Config
+import botocore.session
+
+# Using botocore directly (rather than boto3) keeps Lambda cold start imports light:
+session = botocore.session.get_session()
+# EC2 Describe* APIs throttle aggressively in large accounts, so retry generously with client-side rate limiting:
+client_config = Config(retries={ "max_attempts": 10, "mode": "adaptive" })
+ec2 = session.create_client("ec2", config=client_config)
+
+# Recent describe_all() results by request, which persist between invocations on warm Lambda containers:
+describe_cache = {}
+
+
+def describe_all(operation: str, result_key: str, cache_ttl_secs: float=0, **kwargs) -> List[dict]:
+    """Call a paginated EC2 describe_* API, returning the combined `result_key` list across all pages
+
+    Parameters
+    ----------
+    operation : str
+        Name of the boto3 EC2 client method, e.g. "describe_vpcs"
+    result_key : str
+        Key of the result list in the API response, e.g. "Vpcs"
+    cache_ttl_secs : float (optional)
+        If set, re-use the result of an identical previous request made up to this many seconds ago. Since
+        the cache survives across warm Lambda invocations, only use this for slow-changing data.
+    **kwargs :
+        Passed through to the API (e.g. Filters)
+    """
+    if cache_ttl_secs > 0:
+        cache_key = (operation, result_key, json.dumps(kwargs, sort_keys=True))
+        cached = describe_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] < cache_ttl_secs:
+            return cached[1]
+    result = ec2.get_paginator(operation).paginate(**kwargs).build_full_result().get(result_key, [])
+    if cache_ttl_secs > 0:
+        # (Errors raise above, so only successful responses are ever cached)
+        describe_cache[cache_key] = (time.monotonic(), result)
+    return result
 
-ec2 = boto3.client("ec2")
 
 def get_studio_efs_security_group_ids(
     studio_domain_id: str,
@@ -15,6 +53,10 @@ def get_studio_efs_security_group_ids(
 ) -> Tuple[Union[str, None], Union[str, None]]:
     """Retrieve the security groups you need for [inbound, outbound] comms with SMStudio EFS filesystem
 
+    Both groups are fetched in one EC2 call, filtered server-side by VPC and SageMaker's naming convention.
+    (Querying the home EFS filesystem's mount targets instead would only surface the *inbound* group, since
+    the outbound group is attached to Studio apps rather than the mount targets - and would cost 1+N calls).
+
     Returns
     -------
     inbound : Union[str, None]
@@ -32,22 +74,23 @@ def get_studio_efs_security_group_ids(
     """
     inbound_sg_name = f"security-group-for-inbound-nfs-{studio_domain_id}"
     outbound_sg_name = f"security-group-for-outbound-nfs-{studio_domain_id}"
-    nfs_sgs = ec2.describe_security_groups(
+    nfs_sgs = describe_all(
+        "describe_security_groups",
+        "SecurityGroups",
         Filters=[
             { "Name": "vpc-id", "Values": [vpc_id] },
             { "Name": "group-name", "Values": [inbound_sg_name, outbound_sg_name] },
         ],
-    )["SecurityGroups"]
-    inbound_sgs = list(filter(
-        lambda sg: sg["GroupName"] == inbound_sg_name,
-        nfs_sgs,
-    ))
-    n_inbound_sgs = len(inbound_sgs)
-    outbound_sgs = list(filter(
-        lambda sg: sg["GroupName"] == outbound_sg_name,
-        nfs_sgs,
-    ))
-    n_outbound_sgs = len(outbound_sgs)
+    )
+    # Partition the single result set by name in one pass:
+    sg_ids_by_name = { inbound_sg_name: [], outbound_sg_name: [] }
+    for sg in nfs_sgs:
+        if sg["GroupName"] in sg_ids_by_name:
+            sg_ids_by_name[sg["GroupName"]].append(sg["GroupId"])
+    inbound_sg_ids = sg_ids_by_name[inbound_sg_name]
+    n_inbound_sgs = len(inbound_sg_ids)
+    outbound_sg_ids = sg_ids_by_name[outbound_sg_name]
+    n_outbound_sgs = len(outbound_sg_ids)
     if n_inbound_sgs > 1 or n_outbound_sgs > 1:
         raise ValueError(
             "Found duplicate EFS security groups for SMStudio {}: Got {} inbound, {} outbound".format(
@@ -57,8 +100,8 @@ def get_studio_efs_security_group_ids(
             )
         )
     return (
-        inbound_sgs[0]["GroupId"] if n_inbound_sgs else None,
-        outbound_sgs[0]["GroupId"] if n_outbound_sgs else None,
+        inbound_sg_ids[0] if n_inbound_sgs else None,
+        outbound_sg_ids[0] if n_outbound_sgs else None,
     )
 
 
@@ -74,22 +117,23 @@ def propose_subnet(vpc_id, new_subnet_prefixlen=26):
     """
 
     # Get VPC info:
-    vpc_list = ec2.describe_vpcs(
+    vpc_list = describe_all(
+        "describe_vpcs",
+        "Vpcs",
         Filters=[{ "Name": "vpc-id", "Values": [vpc_id] }],
-    )["Vpcs"]
+    )
     if not len(vpc_list):
         raise ValueError(f"VPC ID {vpc_id} not found")
     vpc_description = vpc_list[0]
-    existing_subnets = ec2.describe_subnets(
+    existing_subnets = describe_all(
+        "describe_subnets",
+        "Subnets",
         Filters=[{ "Name": "vpc-id", "Values": [vpc_id] }],
-    )["Subnets"]
+    )
 
     # Load CIDRs of provided VPC and existing subnets with Python ipaddress library:
     vpc_net = ipaddress.ip_network(vpc_description["CidrBlock"])
-    existing_nets = list(map(
-        lambda subnet: ipaddress.ip_network(subnet["CidrBlock"]),
-        existing_subnets,
-    ))
+    existing_nets = [ipaddress.ip_network(subnet["CidrBlock"]) for subnet in existing_subnets]
 
     # Validate existing configuration:
     # (Could probably skip this since we just retrieved fresh data, but might help to prevent any weird
@@ -120,10 +164,7 @@ def propose_subnet(vpc_id, new_subnet_prefixlen=26):
 
     # Select the first available subnet of requested size:
     try:
-        parent = next(filter(
-            lambda n: n.prefixlen <= new_subnet_prefixlen,
-            available_nets,
-        ))
+        parent = next(n for n in available_nets if n.prefixlen <= new_subnet_prefixlen)
     except StopIteration:
         raise ValueError(f"No vacant subnets of requested size /{new_subnet_prefixlen} left in VPC")
 
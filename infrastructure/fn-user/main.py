@@ -115,9 +115,13 @@ def create_user_profile(config):
         UserSettings=user_settings,
     )
     created = False
-    time.sleep(0.2)
     while not created:
-        response = smclient.describe_user_profile(DomainId=domain_id, UserProfileName=user_profile_name)
+        try:
+            response = smclient.describe_user_profile(DomainId=domain_id, UserProfileName=user_profile_name)
+        except smclient.exceptions.ResourceNotFound:
+            # A just-created profile may not be visible to DescribeUserProfile straight away
+            time.sleep(5)
+            continue
         status_lower = response["Status"].lower()
         if status_lower == "inservice":
             created = True
@@ -138,7 +142,6 @@ def delete_user_profile(domain_id, user_profile_name):
         UserProfileName=user_profile_name,
     )
     deleted = False
-    time.sleep(0.2)
     while not deleted:
         try:
             response = smclient.describe_user_profile(DomainId=domain_id, UserProfileName=user_profile_name)
@@ -166,7 +169,6 @@ def update_user_profile(domain_id, user_profile_name, user_settings):
         UserSettings=user_settings,
     )
     updated = False
-    time.sleep(0.2)
     while not updated:
         response = smclient.describe_user_profile(DomainId=domain_id, UserProfileName=user_profile_name)
         status_lower = response["Status"].lower()
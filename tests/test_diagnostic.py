@@ -0,0 +1,94 @@
+# Python Built-Ins:
+import pickle
+import warnings
+
+# External Dependencies:
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+import pandas as pd
+
+# Local Dependencies:
+from util import diagnostic
+from util.diagnostic import CategoryCounter, parse_timestamps
+
+
+def test_category_counter_merges_missing_values_across_pickled_counters():
+    chunks = [
+        pd.DataFrame({"item_id": ["a", np.nan, "b"], "loc": ["x", np.nan, "y"]}),
+        pd.DataFrame({"item_id": [np.nan, "a", np.nan], "loc": [np.nan, "x", "y"]}),
+    ]
+    whole = pd.concat(chunks)
+
+    # Simulate per-file counters returned from worker processes:
+    counters = []
+    for chunk in chunks:
+        vals = CategoryCounter(["item_id"], dropna=False)
+        combos = CategoryCounter(["item_id", "loc"], dropna=False)
+        vals.update(chunk)
+        combos.update(chunk)
+        counters.append(pickle.loads(pickle.dumps((vals, combos))))
+
+    vals, combos = counters[0]
+    for other_vals, other_combos in counters[1:]:
+        vals.merge(other_vals)
+        combos.merge(other_combos)
+
+    vals_series = vals.to_series()
+    assert vals_series.index.isna().sum() == 1
+    pd.testing.assert_series_equal(
+        vals_series,
+        whole["item_id"].value_counts(dropna=False).sort_index().rename_axis("item_id"),
+        check_names=False,
+    )
+    assert combos.to_series().sum() == len(whole)
+    assert combos.to_series().index.to_frame().isna().all(axis=1).sum() == 1
+
+
+def test_parse_timestamps_does_not_warn_on_non_timestamp_strings():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        parsed = parse_timestamps(pd.Series(["red", "green", "2020-01-02 03:04:05", None]))
+    assert parsed.isna().tolist() == [True, True, False, True]
+
+
+def test_diagnose_top_dimension_values_ordered_by_count(tmp_path, monkeypatch):
+    item_counts = {"a": 1, "b": 3, "c": 2, "d": 4}
+    rows = [
+        f"{item_id},2020-01-{day + 1:02d} 00:00:00,{day}.0"
+        for item_id, count in item_counts.items() for day in range(count)
+    ]
+    tts_path = tmp_path / "tts.csv"
+    tts_path.write_text("item_id,timestamp,demand\n" + "\n".join(rows) + "\n")
+    displayed = []
+    monkeypatch.setattr(diagnostic, "display", displayed.append)
+    monkeypatch.setattr(diagnostic.notebook, "display", displayed.append)
+    monkeypatch.setattr(diagnostic.plt, "show", lambda *args, **kwargs: diagnostic.plt.close("all"))
+
+    diagnostic.diagnose(str(tts_path), frequency="D", domain="RETAIL")
+
+    ix_heading = next(
+        ix for ix, obj in enumerate(displayed)
+        if "Top record counts by dimension item_id" in getattr(obj, "data", "")
+    )
+    top_table = displayed[ix_heading + 1]
+    assert top_table.index.tolist() == ["d", "b", "c", "a"]
+    assert top_table["Records"].tolist() == [4, 3, 2, 1]
+
+
+def test_read_csv_chunks_inferred_types_cover_first_chunk(tmp_path):
+    # Integer-valued targets for well over 64KiB, then fractional, and an optional column empty at first:
+    n_int_rows = 5000
+    lines = [f"item_{i % 7},2020-01-01 00:00:00,{i}," for i in range(n_int_rows)]
+    lines += ["item_0,2020-01-02 00:00:00,2.5,x", "item_1,2020-01-02 00:00:00,3,y"]
+    csv_path = tmp_path / "tts.csv"
+    csv_path.write_text("item_id,timestamp,demand,location\n" + "\n".join(lines) + "\n")
+    assert csv_path.stat().st_size > 2 * (1 << 16)
+
+    chunk = next(diagnostic.read_csv_chunks(str(csv_path), has_header=True))
+
+    assert len(chunk) == n_int_rows + 2
+    assert pd.api.types.is_float_dtype(chunk["demand"])
+    assert chunk["demand"].iloc[-2] == 2.5
+    assert chunk["location"].iloc[-2:].tolist() == ["x", "y"]
+    assert chunk["timestamp"].iloc[0] == "2020-01-01 00:00:00"
@@ -0,0 +1,25 @@
+# External Dependencies:
+import pandas as pd
+import pytest
+
+# Local Dependencies:
+from util import fcst_utils
+
+
+@pytest.mark.parametrize("engine_available", [True, False])
+def test_load_exact_sol_dtypes_independent_of_engine(tmp_path, monkeypatch, engine_available):
+    if engine_available and fcst_utils.pyarrow is None:
+        pytest.skip("pyarrow not installed")
+    elif not engine_available:
+        monkeypatch.setattr(fcst_utils, "pyarrow", None)
+    fname = str(tmp_path / "exact.csv")
+    with open(fname, "w") as f:
+        f.write("a,2020-01-01 00:00:00,1.5\nb,2020-01-01 00:00:00,2\na,2020-01-01 01:00:00,3\n")
+    fcst_utils.load_exact_sol_by_item.cache_clear()
+
+    exact = fcst_utils.load_exact_sol(fname, "a")
+
+    assert exact["timestamp"].tolist() == ["2020-01-01 00:00:00", "2020-01-01 01:00:00"]
+    assert pd.api.types.is_string_dtype(exact["timestamp"])
+    assert exact["target"].dtype == "float64"
+    assert exact["item_id"].dtype == object
@@ -2,23 +2,35 @@
 
 # Python Built-Ins:
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import contextlib
 import csv
+import functools
 import json
 import math
 import os
 import time
+import warnings
 from types import SimpleNamespace
 from typing import Iterable, List, Tuple, Union
 
 # External Dependencies:
-import dateutil
 from IPython.display import display, Markdown
 from matplotlib import pyplot as plt
 import numpy as np
 import pandas as pd
 import sqlite3
 
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:  # Fall back to (slower) pandas CSV parsing
+    pa = None
+try:
+    from tqdm.auto import tqdm
+except ImportError:  # Fall back to a summary print instead of progress bars
+    tqdm = None
+
 # Local Dependencies
 from . import fcst_utils as fcst
 from . import notebook_utils as notebook
@@ -26,6 +38,7 @@ from . import notebook_utils as notebook
 
 # Configuration:
 CHUNKSIZE = 50000  # Max records per file processed in one go - reduce to cut memory consumption, lower speed
+MAX_ONE_SHOT_FILE_BYTES = 256 * 1024 * 1024  # Smaller files are parsed whole (if PyArrow is available)
 WARN_THRESH_MIN_ITEMS = 10  # Warn if number of distinct timeseries to forecast is <N
 WARN_THRESH_LOGLOG_HEAD_HEAVY = -2  # Warn that tail items may be sparse if Pareto log-log less than this.
 EXTENT_BREAKPOINTS = [
@@ -93,6 +106,23 @@ STEPCOUNT_REFERENCES = [
 ]
 
 
+def scan_files(dir_path: str) -> Iterable[str]:
+    """Recursively yield the paths of all files under a directory
+
+    Uses os.scandir directly, so a flat folder of files takes a single directory listing without os.walk's
+    per-level tuple building.
+    """
+    subdirs = []
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                yield entry.path
+            elif entry.is_dir():
+                subdirs.append(entry.path)
+    for subdir in subdirs:
+        yield from scan_files(subdir)
+
+
 def sniff_csv_file(filepath: str) -> Tuple[Union[List[str], None], int]:
     """Examine the start of a CSV file to test metadata
 
@@ -103,16 +133,322 @@ def sniff_csv_file(filepath: str) -> Tuple[Union[List[str], None], int]:
     ncols :
         Number of columns in the data (inferred from start of file, assumed consistent)
     """
-    with open(filepath, "r", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        row1 = next(reader)
-        ncols = len(row1)
-        # If any cells in first row don't fit the valid header type, assume not a header
-        # TODO: Improve this - probably breaks for metadata files
-        if not all(fcst.SchemaAttribute.is_valid_name(cell) for cell in row1):
-            return None, ncols
+    with open(filepath, "r", encoding="utf-8", newline="") as f:
+        line1 = f.readline()
+    if '"' in line1:
+        # Quoted fields may contain delimiters, so need a proper CSV parse:
+        row1 = next(csv.reader([line1]))
+    else:
+        row1 = line1.rstrip("\r\n").split(",")
+    ncols = len(row1)
+    # If any cells in first row don't fit the valid header type, assume not a header
+    # TODO: Improve this - probably breaks for metadata files
+    if not all(fcst.SchemaAttribute.is_valid_name(cell) for cell in row1):
+        return None, ncols
+    else:
+        return row1, ncols
+
+
+def progress_bar(iterable: Iterable, desc: str, unit: str, total: Union[int, None]=None) -> Iterable:
+    """Iterate with a tqdm progress bar if available, else just print a summary line at the end"""
+    if tqdm is not None:
+        yield from tqdm(iterable, desc=desc, unit=unit, total=total)
+        return
+    n = 0
+    for n, item in enumerate(iterable, start=1):
+        yield item
+    print(f"{desc}: Processed {n} {unit}(s)")
+
+
+def estimate_row_bytes(filepath: str, sample_bytes: int=65536) -> float:
+    """Estimate the average bytes per line of a text file from a sample at the start"""
+    with open(filepath, "rb") as f:
+        sample = f.read(sample_bytes)
+    return len(sample) / max(sample.count(b"\n"), 1)
+
+
+def schema_type_to_arrow_type(typename: str):
+    """Map a Forecast schema AttributeType to the PyArrow type it should be parsed as
+
+    Timestamps are kept as strings (like with pandas) so the analysis sees them exactly as written.
+    """
+    if typename in ("string", "timestamp"):
+        return pa.string()
+    elif typename == "integer":
+        return pa.int64()
+    elif typename == "float":
+        return pa.float64()
+
+
+def read_csv_chunks(
+    filepath: str,
+    has_header: bool,
+    names: Union[List[str], None]=None,
+    schema_types: Union[List[str], None]=None,
+    stream: bool=False,
+) -> Iterable[pd.DataFrame]:
+    """Iterate through a CSV file in DataFrame chunks of (approximately) CHUNKSIZE records
+
+    Uses PyArrow's multi-threaded CSV reader where available (reading whole files up to
+    MAX_ONE_SHOT_FILE_BYTES, else streaming), or pandas otherwise.
+
+    Parameters
+    ----------
+    filepath :
+        Local path to the CSV file
+    has_header :
+        Whether the first line of the file is a header row
+    names : (Optional)
+        Column names to use (overriding the header row, if present)
+    schema_types : (Optional)
+        Forecast schema AttributeTypes of each column. If not provided, types will be inferred from the first
+        chunk of data (so later chunks may fail to parse if their types differ, e.g. for schema inference).
+    stream : (Optional)
+        Set True to always use the streaming reader, e.g. if only the first chunk(s) will be consumed.
+    """
+    if pa is None:
+        for df in pd.read_csv(
+            filepath,
+            chunksize=CHUNKSIZE,
+            header=0 if has_header else None,
+            names=names,
+            dtype={
+                name: fcst.ATTRIBUTE_NUMPY_TYPES[typename]
+                for name, typename in zip(names, schema_types)
+            } if schema_types else None,
+        ):
+            # Nullable Int64 is only needed where there are actually nulls, and plain int64 is faster:
+            for col in df:
+                if isinstance(df[col].dtype, pd.Int64Dtype) and not df[col].hasnans:
+                    df[col] = df[col].astype(np.int64)
+            yield df
+        return
+
+    column_options = dict(
+        column_names=names,
+        skip_rows=1 if (has_header and names) else 0,
+        autogenerate_column_names=not (has_header or names),
+    )
+    parse_options = pa_csv.ParseOptions(delimiter=",")
+    # Streaming block size, to yield approximately CHUNKSIZE records per batch:
+    block_size = max(int(CHUNKSIZE * estimate_row_bytes(filepath)), 1 << 16)
+    if schema_types:
+        column_types = {
+            name: schema_type_to_arrow_type(typename) for name, typename in zip(names, schema_types)
+        }
+    else:
+        # Infer types from the first streaming block (i.e. the whole first chunk, like pandas would), but
+        # keep timestamp-like columns as raw strings for consistency with the explicit-schema case, and
+        # treat columns which are empty in this block as strings rather than PyArrow's null type:
+        probe = pa_csv.open_csv(
+            filepath,
+            read_options=pa_csv.ReadOptions(block_size=block_size, **column_options),
+            parse_options=parse_options,
+        )
+        column_types = {
+            field.name: (
+                pa.string() if (
+                    pa.types.is_timestamp(field.type)
+                    or pa.types.is_date(field.type)
+                    or pa.types.is_null(field.type)
+                )
+                else field.type
+            )
+            for field in probe.schema
+        }
+        probe.close()
+        # Types inferred from the first chunk might not fit later ones, so always stream: The first chunk
+        # is then guaranteed to match the inferred types.
+        stream = True
+    convert_options = pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+
+    if not stream and os.path.getsize(filepath) <= MAX_ONE_SHOT_FILE_BYTES:
+        # Small enough to read whole, which PyArrow can parallelize across blocks of the file (unlike
+        # the streaming reader, which parses one block at a time):
+        df = arrow_to_pandas(pa_csv.read_csv(
+            filepath,
+            read_options=pa_csv.ReadOptions(use_threads=True, **column_options),
+            parse_options=parse_options,
+            convert_options=convert_options,
+        ))
+        for ixstart in range(0, len(df), CHUNKSIZE):
+            yield df.iloc[ixstart:ixstart + CHUNKSIZE]
+        return
+
+    reader = pa_csv.open_csv(
+        filepath,
+        read_options=pa_csv.ReadOptions(
+            block_size=block_size,
+            use_threads=True,
+            **column_options,
+        ),
+        parse_options=parse_options,
+        convert_options=convert_options,
+    )
+    for batch in reader:
+        if batch.num_rows:
+            yield arrow_to_pandas(batch)
+
+
+def arrow_to_pandas(data) -> pd.DataFrame:
+    """Convert a PyArrow Table or RecordBatch to pandas, with integer columns as plain numpy int64
+
+    ...Except for any integer columns containing nulls, which are converted to pandas' nullable Int64
+    (rather than PyArrow's default of float64).
+    """
+    df = data.to_pandas()
+    for ixcol, field in enumerate(data.schema):
+        col = data.column(ixcol)
+        if pa.types.is_integer(field.type) and col.null_count:
+            df[field.name] = pd.arrays.IntegerArray(
+                col.fill_null(0).to_numpy().astype(np.int64),
+                col.is_null().to_numpy(zero_copy_only=False),
+            )
+    return df
+
+
+# CategoryCounter codebook key for missing values: pd.factorize never yields None as a value, and unlike NaN
+# it still equals itself after pickling between processes (so counters from different files merge cleanly)
+MISSING_VALUE_KEY = None
+
+
+class CategoryCounter:
+    """Accumulate record counts by (combinations of) categorical field values over many DataFrame chunks
+
+    Values are encoded to integer codes against codebooks kept between chunks, so that counts can be
+    accumulated with np.bincount rather than aligning string-indexed pandas Series on every chunk.
+
+    Parameters
+    ----------
+    fields :
+        Name(s) of the field(s) whose (combined) values should be counted
+    dropna :
+        If True (like DataFrame.groupby()), records with missing values in any of the fields are ignored.
+        If False (like Series.value_counts(dropna=False)), missing values are counted too.
+    """
+    def __init__(self, fields: List[str], dropna: bool=True):
+        self.fields = fields
+        self.dropna = dropna
+        self.codebooks = [{} for _ in fields]  # {value: code} per field
+        self.combo_codebook = {}  # {tuple of per-field codes: combination code} (multi-field only)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def encode_field(self, ixfield: int, values) -> np.ndarray:
+        """Map raw values of field `ixfield` to global codes (-1 for missing values, if dropna)"""
+        codebook = self.codebooks[ixfield]
+        chunk_codes, uniques = pd.factorize(values)
+        # Last entry in the map is picked up by chunk_codes == -1 (missing values):
+        code_map = np.fromiter(
+            (codebook.setdefault(v, len(codebook)) for v in uniques),
+            dtype=np.int64,
+            count=len(uniques),
+        )
+        if self.dropna or not (chunk_codes < 0).any():
+            na_code = -1
+        else:
+            na_code = codebook.setdefault(MISSING_VALUE_KEY, len(codebook))
+        return np.append(code_map, na_code)[chunk_codes]
+
+    def update(self, df: pd.DataFrame) -> None:
+        """Add the records in `df` to the counts"""
+        field_codes = [self.encode_field(ix, df[f].values) for ix, f in enumerate(self.fields)]
+        if len(field_codes) == 1:
+            codes = field_codes[0]
         else:
-            return row1, ncols
+            # Combine per-field codes to one int64 key per record (valid only within this chunk, since the
+            # codebooks may grow), then map the chunk's unique keys to global combination codes:
+            radices = [len(codebook) for codebook in self.codebooks]
+            keys = np.zeros(len(df), dtype=np.int64)
+            for field_code, radix in zip(field_codes, radices):
+                keys = keys * radix + field_code
+            if self.dropna:
+                keys = keys[np.logical_and.reduce([c >= 0 for c in field_codes])]
+            unique_keys, key_inverse = np.unique(keys, return_inverse=True)
+            key_parts = []
+            for radix in reversed(radices):
+                unique_keys, part = np.divmod(unique_keys, radix)
+                key_parts.insert(0, part.tolist())
+            code_map = np.fromiter(
+                (
+                    self.combo_codebook.setdefault(combo, len(self.combo_codebook))
+                    for combo in zip(*key_parts)
+                ),
+                dtype=np.int64,
+                count=len(key_parts[0]),
+            )
+            codes = code_map[key_inverse]
+        codes = codes[codes >= 0]
+        chunk_counts = np.bincount(codes, minlength=len(self.counts))
+        chunk_counts[:len(self.counts)] += self.counts
+        self.counts = chunk_counts
+
+    def merge(self, other: "CategoryCounter") -> None:
+        """Add the counts from another CategoryCounter (over the same fields) to this one"""
+        field_code_maps = [
+            np.fromiter(
+                (codebook.setdefault(v, len(codebook)) for v in other_codebook),
+                dtype=np.int64,
+                count=len(other_codebook),
+            )
+            for codebook, other_codebook in zip(self.codebooks, other.codebooks)
+        ]
+        if len(self.fields) == 1:
+            code_map = field_code_maps[0]
+        else:
+            code_map = np.fromiter(
+                (
+                    self.combo_codebook.setdefault(
+                        tuple(m[c] for m, c in zip(field_code_maps, combo)),
+                        len(self.combo_codebook),
+                    )
+                    for combo in other.combo_codebook
+                ),
+                dtype=np.int64,
+                count=len(other.combo_codebook),
+            )
+        codes = code_map[:len(other.counts)]
+        counts = np.zeros(max(len(self.counts), codes.max(initial=-1) + 1), dtype=np.int64)
+        counts[:len(self.counts)] = self.counts
+        counts[codes] += other.counts  # (Codes are unique, so no need for np.add.at)
+        self.counts = counts
+
+    def to_series(self) -> pd.Series:
+        """Counts by observed value (combination) as a pandas Series sorted by index, like groupby().size()"""
+        field_values = [
+            pd.Index([np.nan if v is MISSING_VALUE_KEY else v for v in codebook]) for codebook in self.codebooks
+        ]
+        if len(self.fields) == 1:
+            index = field_values[0].rename(self.fields[0])
+        else:
+            combo_field_codes = np.array(list(self.combo_codebook), dtype=np.int64).reshape(
+                len(self.combo_codebook),
+                len(self.fields),
+            )
+            index = pd.MultiIndex.from_arrays(
+                [values.take(combo_field_codes[:, ix]) for ix, values in enumerate(field_values)],
+                names=self.fields,
+            )
+        result = pd.Series(self.counts, index=index)
+        return result[result > 0].sort_index()
+
+
+def parse_timestamps(timestamps: pd.Series) -> pd.Series:
+    """Parse a series of timestamp strings to datetimes, with NaT for unparseable values
+
+    Tries the explicit formats Amazon Forecast accepts first (so pandas can use its fast strptime-style
+    path), and only falls back to format inference for any values which didn't match.
+    """
+    parsed = pd.to_datetime(timestamps, format="%Y-%m-%d %H:%M:%S", errors="coerce", cache=True)
+    for fmt in ("%Y-%m-%d", None):
+        unparsed = parsed.isna() & timestamps.notna()
+        if not unparsed.any():
+            break
+        with warnings.catch_warnings():
+            # Inference is also run on non-timestamp columns during schema inference, so don't warn when
+            # no format can be inferred (the values are simply left as NaT):
+            warnings.simplefilter("ignore", UserWarning)
+            parsed[unparsed] = pd.to_datetime(timestamps[unparsed], format=fmt, errors="coerce", cache=True)
+    return parsed
 
 
 def bin_timestamps_to_frequency(timestamps: pd.Series, freq: str) -> pd.Series:
@@ -137,7 +473,7 @@ def bin_timestamps_to_frequency(timestamps: pd.Series, freq: str) -> pd.Series:
         # Series is datetimes: Apply the datetime mapper fn
         return freq_spec["dt_series_mapper"](timestamps)
     elif pd.api.types.is_string_dtype(dtype):
-        return freq_spec["dt_series_mapper"](pd.to_datetime(timestamps))
+        return freq_spec["dt_series_mapper"](parse_timestamps(timestamps))
     else:
         raise ValueError(f"Series does not seem to contain timestamps: dtype={dtype}")
 
@@ -167,10 +503,12 @@ def validate_tts_schema_on_domain(
     custom_fields : List[str]
         List of names of used custom fields not specified by the domain
     """
-    domain_spec = fcst.DOMAINS[domain]
-    for fname in domain_spec.tts.required_fields:
-        matching_fields = [f for f in tts_schema["Attributes"] if f["AttributeName"] == fname]
-        if len(matching_fields) < 1:
+    required_specs = fcst.DOMAINS[domain].tts.required_fields
+    optional_specs = fcst.DOMAINS[domain].tts.optional_fields
+    attrs_by_name = {f["AttributeName"]: f for f in tts_schema["Attributes"]}
+    for fname, spec in required_specs.items():
+        matching_field = attrs_by_name.get(fname)
+        if matching_field is None:
             raise ValueError(
                 "{}TTS schema is missing required field '{}' for domain '{}'".format(
                     "" if is_tts_schema_explicit else "Inferred ",
@@ -178,50 +516,36 @@ def validate_tts_schema_on_domain(
                     domain,
                 ),
             )
-        elif (
-            matching_fields[0]["AttributeType"]
-            != domain_spec.tts.required_fields[fname].AttributeType
-        ):
+        elif matching_field["AttributeType"] != spec.AttributeType:
             raise ValueError(" ".join((
                 "{}TTS schema has type '{}' for required field '{}'".format(
                     "" if is_tts_schema_explicit else "Inferred ",
+                    matching_field["AttributeType"],
                     fname,
-                    domain,
                 ),
-                "which domain '{}' specifies as '{}'".format(
-                    domain,
-                    domain_spec.tts.required_fields[fname].AttributeType,
-                )
+                "which domain '{}' specifies as '{}'".format(domain, spec.AttributeType)
             )))
     optional_fields_used = []
-    for fname in domain_spec.tts.optional_fields:
-        try:
-            matching_field = next(
-                f for f in tts_schema["Attributes"] if f["AttributeName"] == fname
-            )
-        except StopIteration:
+    for fname, spec in optional_specs.items():
+        matching_field = attrs_by_name.get(fname)
+        if matching_field is None:
             continue
-        if (
-            matching_field["AttributeType"]
-            == domain_spec.tts.optional_fields[fname].AttributeType
-        ):
+        if matching_field["AttributeType"] == spec.AttributeType:
             optional_fields_used.append(fname)
         else:
             # TODO: Warning instead
             print(" ".join((
                 f"WARNING: Field '{fname}', which domain '{domain}' specifies as optional with",
                 "type '{}', has been used with different type '{}'.".format(
-                    domain_spec.tts.optional_fields[fname].AttributeType,
+                    spec.AttributeType,
                     matching_field["AttributeType"],
                 ),
                 "Consider changing field name or using this optional field per the domain spec.",
             )))
-    schema_fnames = [f["AttributeName"] for f in tts_schema["Attributes"]]
-    required_fnames = list(domain_spec.tts.required_fields.keys())
-    custom_fnames = [
-        f for f in schema_fnames
-        if f not in (optional_fields_used + list(domain_spec.tts.required_fields.keys()))
-    ]
+    required_fnames = list(required_specs)
+    # (Set for membership tests, but keep the list in schema order)
+    domain_fnames = set(required_fnames).union(optional_fields_used)
+    custom_fnames = [f for f in attrs_by_name if f not in domain_fnames]
     print("\n".join((
         f"Validated schema conforms to domain '{domain}' with:",
         f"Required fields {required_fnames}",
@@ -296,19 +620,285 @@ def plot_loglog(
     return (slope, intercept, rmse)
 
 
+def get_tts_field_roles(
+    tts_schema,
+    required_fields: List[str],
+    domain: Union[str, None]=None,
+) -> Tuple[str, str, List[str]]:
+    """Identify the timestamp, target and dimension fields of a (domain-validated) target time-series schema
+
+    Returns
+    -------
+    timestamp_field : str
+        Name of the (required) timestamp field
+    target_field : str
+        Name of the target value field
+    dimension_fields : List[str]
+        Names of all other fields, in schema order
+    """
+    attrs_by_name = {f["AttributeName"]: f for f in tts_schema["Attributes"]}
+    timestamp_field = next(
+        f for f in required_fields if attrs_by_name[f]["AttributeType"] == "timestamp"
+    )
+    target_field = fcst.DOMAINS[domain].target_field if domain is not None else next(
+        f for f in required_fields if attrs_by_name[f]["AttributeType"] not in ("timestamp", "string")
+    )
+    dimension_fields = [f for f in attrs_by_name if f not in (timestamp_field, target_field)]
+    return timestamp_field, target_field, dimension_fields
+
+
 def add_pct_to_value_counts(value_counts: pd.Series, clip: Union[int, None]=None) -> pd.DataFrame:
     """Convert a Pandas value_counts output (series) to a displayable dataframe with (string) % column"""
     n_entries = value_counts.sum()
-    result = value_counts[:clip].to_frame("Records")
-    result["Percentage"] = result["Records"] / n_entries
-    # Convert to % string representation:
-    result["Percentage"] = pd.Series(
-        ["{0:.2f}%".format(val * 100) for val in result["Percentage"]],
-        index=result.index,
-    )
+    result = value_counts.iloc[:clip].to_frame("Records")
+    # Convert to % string representation (only for the clipped rows):
+    result["Percentage"] = (result["Records"] * (100.0 / n_entries)).map("{:.2f}%".format)
     return result
 
 
+def diagnose_tts_file(
+    tts_filename: str,
+    has_header: bool,
+    tts_schema,
+    timestamp_field: str,
+    target_field: str,
+    dimension_fields: List[str],
+    frequency: Union[str, None]=None,
+    show_progress: bool=False,
+) -> SimpleNamespace:
+    """Calculate diagnostic statistics for one target time-series file, for combining across files
+
+    Parameters
+    ----------
+    tts_filename :
+        Local path to the target time-series CSV file
+    has_header :
+        Whether the file's first line is a header row
+    tts_schema :
+        (Explicit or inferred) schema dict for the target time-series
+    timestamp_field :
+        Name of the timestamp field in the schema
+    target_field :
+        Name of the target value field in the schema
+    dimension_fields :
+        Names of the other (dimension) fields in the schema
+    frequency : (Optional)
+        The 'ForecastFrequency' string: If omitted, contiguous data ranges will not be calculated.
+    show_progress : (Optional)
+        Set True to display a progress bar over the file's chunks.
+
+    Returns
+    -------
+    stats :
+        Partial statistics for the file (see initialization below for the fields)
+    """
+    stats = SimpleNamespace(
+        n_chunks=0,
+        tts_start=None,
+        tts_end=None,
+        n_records=0,
+        n_records_nonulls=0,
+        num_nulls_by_field=np.zeros(len(tts_schema["Attributes"]), dtype=np.int64),  # In schema order
+        unique_dimension_vals={f: CategoryCounter([f], dropna=False) for f in dimension_fields},
+        unique_dimension_combos=CategoryCounter(dimension_fields),
+        max_aggregated_records=0,  # Most records seen mapped to a timestep-[dimensions] bucket in a chunk
+        total_ranges=None,  # Needs to be initialized once dimension_fields is known
+    )
+    tts_chunker = read_csv_chunks(
+        tts_filename,
+        has_header=has_header,
+        names=[f["AttributeName"] for f in tts_schema["Attributes"]],
+        schema_types=[f["AttributeType"] for f in tts_schema["Attributes"]],
+    )
+
+    if show_progress:
+        tts_chunker = progress_bar(tts_chunker, desc=os.path.basename(tts_filename), unit="chunk")
+    for tts_chunk in tts_chunker:
+        stats.n_chunks += 1
+
+        if stats.total_ranges is None:
+            stats.total_ranges = pd.DataFrame()
+            for f in dimension_fields:
+                stats.total_ranges[f] = pd.Series([], dtype=tts_chunk[f].dtype)
+            stats.total_ranges["starts"] = pd.Series([], dtype="datetime64[ns]")
+            stats.total_ranges["ends"] = pd.Series([], dtype="datetime64[ns]")
+
+        # Update statistics from this chunk (parsing timestamps once, for binning later too):
+        timestamps = parse_timestamps(tts_chunk[timestamp_field])
+        ts_values = timestamps.values
+        ts_values = ts_values[~np.isnat(ts_values)]
+        if len(ts_values):
+            chunk_min_ts = ts_values.min()
+            chunk_max_ts = ts_values.max()
+            stats.tts_start = chunk_min_ts if stats.tts_start is None else min(
+                (stats.tts_start, chunk_min_ts)
+            )
+            stats.tts_end = chunk_max_ts if stats.tts_end is None else max(
+                (stats.tts_end, chunk_max_ts)
+            )
+        stats.n_records += len(tts_chunk)
+        # Count nulls per column, and OR together the column null masks to find rows with any nulls
+        # (rather than a row-wise any() over a 2D bool frame):
+        chunk_null_rows = np.zeros(len(tts_chunk), dtype=bool)
+        for ixcol, col in enumerate(tts_chunk):  # (Columns are in schema order)
+            col_nulls = tts_chunk[col].isna().values
+            stats.num_nulls_by_field[ixcol] += np.count_nonzero(col_nulls)
+            chunk_null_rows |= col_nulls
+        stats.n_records_nonulls += len(tts_chunk) - int(chunk_null_rows.sum())
+        for fname in dimension_fields:
+            stats.unique_dimension_vals[fname].update(tts_chunk)
+        if len(dimension_fields) > 1:  # (Else, item counts are just the dimension's value counts)
+            stats.unique_dimension_combos.update(tts_chunk)
+
+        if frequency is not None:
+            # In this section, we'll construct/update the list of observed contiguous ranges.
+            freq_spec = fcst.FREQUENCIES[frequency]
+
+            # First map the raw timestamps to their bin locations, and calculate one step back:
+            binned_timestamps = bin_timestamps_to_frequency(timestamps, frequency)
+            binned_timestamps.name = "binned_timestamps"
+            prev_timestamps = binned_timestamps - freq_spec["dt_offset"]
+            prev_timestamps.name = "prev_timestamps"
+
+            # Count the number of valid (non-blank target field) records in each bin, and update the
+            # metric for most records ever seen aggregated to a single bin:
+            record_counts = pd.concat(
+                [binned_timestamps, tts_chunk[dimension_fields + [target_field]]],
+                axis=1,
+            ).groupby(["binned_timestamps"] + dimension_fields, sort=False).count()
+            record_counts = record_counts[record_counts[target_field] > 0]
+            stats.max_aggregated_records = max(
+                stats.max_aggregated_records,
+                record_counts[target_field].max()
+            )
+
+            # Offset the index and self-join to calculate which bins don't have any data at the timestep
+            # directly preceding them, and therefore are the `start` of a contiguous run:
+            prev_count = record_counts.copy().rename(columns={ target_field: "prev" })
+            prev_count.index = prev_count.index.set_levels(
+                prev_count.index.levels[0].shift(
+                    periods=freq_spec["dt_periods"],
+                    freq=freq_spec["dt_freq"]
+                ),
+                level=0,
+            )
+            starts = record_counts.join(prev_count)
+            starts = starts[starts["prev"].isna()].reset_index()[
+                ["binned_timestamps"] + dimension_fields
+            ].rename(columns={ "binned_timestamps": "starts" })
+
+            # ...And do the same thing with opposite offset to find the `ends` of a contiguous run:
+            next_count = record_counts.copy().rename(columns={ target_field: "next" })
+            next_count.index = next_count.index.set_levels(
+                next_count.index.levels[0].shift(
+                    periods=-1 * freq_spec["dt_periods"],
+                    freq=freq_spec["dt_freq"]
+                ),
+                level=0,
+            )
+            ends = record_counts.join(next_count)
+            ends = ends[ends["next"].isna()].reset_index()[
+                ["binned_timestamps"] + dimension_fields
+            ].rename(columns={"binned_timestamps": "ends"})
+
+            # Merge the two together to describe the contiguous ranges in the dataset:
+            # Every start necessarily has a corresponding end, so it should be sufficient to join all
+            # end dates >= each start date and then just pick the earliest one - as we do here.
+            ranges = pd.merge(starts, ends, on=dimension_fields)
+            ranges = ranges[
+                ranges["starts"] <= ranges["ends"]
+            ].groupby(dimension_fields + ["starts"]).min().reset_index()
+
+            # Because we're processing the data in chunks, we now need to take on the trickier task of
+            # *consolidating* these new detected time ranges with whatever we might have seen before. We
+            # don't want to encode any assumptions about how users have sharded up files or sorted their
+            # data - so we don't know much about hoow these new ranges might overlap with existing.
+            #
+            # We know that ranges should be consolidated when they're on *adjacent* timesteps (not just
+            # overlapping), so will start by calculating fields to join on for that and then appending
+            # the new ranges to the existing list:
+            ranges["prestarts"] = ranges["starts"] - freq_spec["dt_offset"]
+            ranges["postends"] = ranges["ends"] + freq_spec["dt_offset"]
+
+            stats.total_ranges = consolidate_ranges(stats.total_ranges.append(ranges), dimension_fields)
+        # endif frequency is not None:
+    # endfor tts_chunk in tts_chunker
+    return stats
+
+
+def consolidate_ranges(total_ranges: pd.DataFrame, dimension_fields: List[str]) -> pd.DataFrame:
+    """Merge overlapping or adjacent (contiguous) data ranges for each item
+
+    Parameters
+    ----------
+    total_ranges :
+        Dataframe of ranges with item dimension fields and "starts", "prestarts", "ends", "postends"
+        timestamps ("prestarts" and "postends" being one step before/after the range)
+    dimension_fields :
+        Names of the fields identifying an item
+    """
+    # Consolidating detected ranges is an iterative process because a consolidation could bring
+    # two previously separate ranges into overlap.
+    # TODO: Is there an upper bound on the # iterations required for combining two sane sets?
+    prev_n_ranges = float("inf")
+
+    # Pandas only supports equality joins, with inequality joins implemented via merge() and then
+    # filtering the result set. This is memory-inefficient for big chunk sizes we'd like to 
+    # process, so we'll use an in-mem SQLite connection to do the join in SQL instead.
+    with contextlib.closing(sqlite3.connect(":memory:")) as conn: # Auto-close when done
+        # Could also consider using:
+        # with conn: (to auto-commit transaction)
+        # ...but we don't actually want the overhead of committing.
+        while prev_n_ranges > len(total_ranges):
+            prev_n_ranges = len(total_ranges)
+            total_ranges.to_sql("total_ranges", conn, index=False)  # Export the table to SQLite
+            consolidated = pd.read_sql_query(
+                # Self-join on overlapping ranges and pick the furthest-apart start/end:
+                f"""
+                    select distinct
+                        { ", ".join(map(lambda dim: f"X.{dim}", dimension_fields)) },
+                        X.starts as starts_x,
+                        min(X.starts, Y.starts) as starts,
+                        min(X.prestarts, Y.prestarts) as prestarts,
+                        max(X.ends, Y.ends) as ends,
+                        max(X.postends, Y.postends) as postends
+                    from
+                        total_ranges X join total_ranges Y on
+                        { " and ".join(map(lambda dim: f"X.{dim} = Y.{dim}", dimension_fields))}
+                        and X.ends >= Y.prestarts
+                        and X.starts <= Y.postends
+                        and (X.starts >= Y.starts or X.ends <= Y.ends)
+                """,
+                conn,
+            )
+            # Restore the pandas field types from SQLite import:
+            for field in ["starts_x", "starts", "prestarts", "ends", "postends"]:
+                consolidated[field] = pd.to_datetime(consolidated[field])
+            for field in dimension_fields:
+                consolidated[field] = consolidated[field].astype(total_ranges[field].dtype)
+
+            # Clear out the SQLLite table for next loop
+            with contextlib.closing(conn.cursor()) as cursor: # auto-closes
+                cursor.execute("drop table total_ranges")#
+
+            # The above join isn't sufficient by itself, because the self-join path allows
+            # redundant ranges through. So we also summarize by left start date and drop
+            # duplicates, to clear those out:
+            # TODO: Move entirely into SQL for more efficient execution planning?
+            consolidated = consolidated.groupby(dimension_fields + ["starts_x"]).agg({
+                "starts": "min",
+                "prestarts": "min",
+                "ends": "max",
+                "postends": "max",
+            }).reset_index()
+            total_ranges = consolidated[
+                dimension_fields + ["starts", "prestarts", "ends", "postends"]
+            ].drop_duplicates()
+        # endwhile prev_n_ranges > len(total_ranges):
+    # endwith sqllite connection
+    return total_ranges
+
+
 def diagnose(
     tts_path: str,
     frequency: Union[str, None]=None,
@@ -353,24 +943,11 @@ def diagnose(
             domain,
             is_tts_schema_explicit
         )
-        timestamp_field = next(
-            f["AttributeName"] for f in tts_schema["Attributes"]
-            if f["AttributeName"] in reqd_fields and f["AttributeType"] == "timestamp"
-        )
-        target_field = fcst.DOMAINS[domain].target_field if domain is not None else next(
-            f["AttributeName"] for f in tts_schema["Attributes"]
-            if f["AttributeName"] in reqd_fields and f["AttributeType"] not in ("timestamp", "string")
-        )
-        dimension_fields = [
-            f["AttributeName"] for f in tts_schema["Attributes"]
-            if f["AttributeName"] not in (timestamp_field, target_field)
-        ]
+        timestamp_field, target_field, dimension_fields = get_tts_field_roles(tts_schema, reqd_fields, domain)
 
     if os.path.isdir(tts_path):
-        tts_filenames = sorted(
-            os.path.join(dp, f) for dp, dn, fn in os.walk(os.path.expanduser(tts_path)) for f in fn
-        )
-        filtered_filenames = sorted(filter(lambda f: f.lower().endswith(".csv"), tts_filenames))
+        tts_filenames = sorted(scan_files(os.path.expanduser(tts_path)))
+        filtered_filenames = [f for f in tts_filenames if f.lower().endswith(".csv")]  # (Still sorted)
         n_raw = len(tts_filenames)
         n_filtered = len(filtered_filenames)
         if n_filtered > 0 and n_filtered < n_raw:
@@ -385,20 +962,9 @@ def diagnose(
         "\n    ".join(tts_filenames[:10] + (["...etc."] if len(tts_filenames) > 10 else []))
     ))
 
-    # Tracking variables for analysis:
-    n_chunks_global = 0  # Total number of batches across all files
-    global_tts_start = None
-    global_tts_end = None
-    total_records = 0
-    total_records_nonulls = 0
-    num_nulls_by_field = None
-    unique_dimension_vals = {}
-    unique_dimension_combos = None
-    total_ranges = None  # Needs to be initialized once dimension_fields is known
-    # The most records we've ever seen aggregated/mapped to a timestep-[dimensions] bucket (which is a
-    # lower bound, because we only see the contents of one chunk at a time):
-    max_chunk_aggregated_records = 0
-
+    # Check each file's columns against the TTS schema (inferring it from the first file with data, if it
+    # wasn't provided) before starting the heavier analysis:
+    tts_files = []  # (filename, has_header) for each file with data
     for tts_filename in tts_filenames:
         header_columns, ncols = sniff_csv_file(tts_filename)
 
@@ -425,307 +991,167 @@ def diagnose(
                             f"but found {header} at this location in file {tts_filename}",
                             "- Column orders must match between TTS schema and all CSVs.",
                         )))
-        tts_chunker = pd.read_csv(
-            tts_filename,
-            chunksize=CHUNKSIZE,
-            header=None if header_columns is None else 0,
-            names=[f["AttributeName"] for f in tts_schema["Attributes"]] if tts_schema else None,
-            dtype={
-                f["AttributeName"]: fcst.SchemaAttribute.type_to_numpy_type(f["AttributeType"])
-                for f in tts_schema["Attributes"]
-            } if tts_schema else None,
-        )
-
-        # Next we'll read actual file contents and infer data types, so it might be that we're able to infer
-        # column names from the provided Domain where neither CSV headers or tts_schema were provided. This
-        # 'renames' dict will track the mapping from automated Pandas colnames to "true" headings for future
-        # chunks:
-        renames = None if tts_schema or header_columns else {}
-
-        # TODO: Progress bar instead of prints
-        for ixchunk, tts_chunk in enumerate(tts_chunker):
-            print(f"Processing file chunk {ixchunk} (global chunk {n_chunks_global})")
-            n_chunks_global += 1
-            if tts_schema is None:
-                # TTS schema was not explicitly provided and hasn't been inferred yet - infer from data.
-                tts_schema = {
-                    "Attributes": []
+        if tts_schema is None:
+            # TTS schema was not explicitly provided and hasn't been inferred yet - infer from the first
+            # chunk of data. It might be that we're able to infer column names from the provided Domain
+            # where neither CSV headers or tts_schema were provided.
+            tts_chunk = next(
+                read_csv_chunks(tts_filename, has_header=header_columns is not None, stream=True),
+                None,
+            )
+            if tts_chunk is None:
+                continue  # No data in this file
+            tts_schema = {
+                "Attributes": []
+            }
+            attrs_by_type = defaultdict(list)
+            for ixcol, col in enumerate(tts_chunk):
+                dtype = tts_chunk[col].dtype
+                if pd.api.types.is_integer_dtype(dtype):
+                    schematype = "integer"
+                elif pd.api.types.is_float_dtype(dtype):
+                    schematype = "float"
+                elif pd.api.types.is_string_dtype(dtype):
+                    # Timestamp if a sample of (non-null) values all parse as dates:
+                    sample = tts_chunk[col].dropna().head(32)
+                    parsed = parse_timestamps(sample)
+                    schematype = "timestamp" if len(sample) and parsed.notna().all() else "string"
+                else:
+                    raise ValueError(
+                        f"Unexpected pandas dtype {dtype} at column {ixcol} ({col}) of {tts_filename}"
+                    )
+                attribute = {
+                    "AttributeName": col,
+                    "AttributeType": schematype,
                 }
-                field_counts_by_type = defaultdict(int)
-                for ixcol, col in enumerate(tts_chunk):
-                    dtype = tts_chunk[col].dtype
-                    if pd.api.types.is_integer_dtype(dtype):
-                        schematype = "integer"
-                    elif pd.api.types.is_float_dtype(dtype):
-                        schematype = "float"
-                    elif pd.api.types.is_string_dtype(dtype):
-                        try:
-                            pd.to_datetime(tts_chunk[col][0:5], infer_datetime_format=True)
-                            schematype = "timestamp"
-                        except (pd.errors.ParserError, dateutil.parser.ParserError):
-                            schematype = "string"
-                    else:
-                        raise ValueError(
-                            f"Unexpected pandas dtype {dtype} at column {ixcol} ({col}) of {tts_filename}"
-                        )
-                    field_counts_by_type[schematype] += 1
-                    tts_schema["Attributes"].append({
-                        "AttributeName": col,
-                        "AttributeType": schematype,
-                    })
-                if header_columns is None:
-                    # Try to infer column names from types, if missing:
-                    if domain is None:
-                        # TODO: Infer from field type counts? Only works in very few cases
-                        raise NotImplementedError(
-                            "domain must be provided when tts_schema is not and source files have no headers"
-                        )
-                    # For data types where there's exactly one matching field in the data and in the
-                    # domain schema, we can infer correspondence.
-                    for schematype in field_counts_by_type:
-                        if field_counts_by_type[schematype] > 1:
-                            raise ValueError(" ".join([
-                                "Cannot infer column names from domain and detected data types:",
-                                "{} (>1) fields in input have detected type '{}'".format(
-                                    field_counts_by_type[schematype],
-                                    schematype,
-                                ),
-                            ]))
-                        else:  # Implicitly =1 due to defaultdict, so the below next() will work
-                            attribute = next(
-                                a for a in tts_schema["Attributes"] if a["AttributeType"] == schematype
-                            )
-                            matching_required_fields = [
-                                f for f in fcst.DOMAINS[domain].tts.required_fields
-                                if fcst.DOMAINS[domain].tts.required_fields[f].AttributeType == schematype
-                            ]
-                            n_matching_required = len(matching_required_fields)
-                            if n_matching_required > 1:
-                                raise ValueError(" ".join((
-                                    f"Domain {domain} requires {n_matching_required} fields of type",
-                                    f"{schematype}, but data contains only one.",
-                                )))
-                            matching_optional_fields = [
-                                f for f in fcst.DOMAINS[domain].tts.optional_fields
-                                if fcst.DOMAINS[domain].tts.optional_fields[f].AttributeType == schematype
-                            ]
-                            n_matching_optional = len(matching_optional_fields)
-                            if n_matching_required == 1:
-                                renames[attribute["AttributeName"]] = matching_required_fields[0]
-                                attribute["AttributeName"] = matching_required_fields[0]
-                            elif n_matching_required == 0 and n_matching_optional == 1:
-                                renames[attribute["AttributeName"]] = matching_optional_fields[0]
-                                attribute["AttributeName"] = matching_optional_fields[0]
-                print(f"Inferred target time-series schema:\n{json.dumps(tts_schema, indent=2)}")
-                reqd_fields, optional_fields, custom_fields = validate_tts_schema_on_domain(
-                    tts_schema,
-                    domain,
-                    is_tts_schema_explicit
-                )
-                timestamp_field = next(
-                    f["AttributeName"] for f in tts_schema["Attributes"]
-                    if f["AttributeName"] in reqd_fields and f["AttributeType"] == "timestamp"
-                )
-                target_field = fcst.DOMAINS[domain].target_field if domain is not None else next(
-                    f["AttributeName"] for f in tts_schema["Attributes"]
-                    if f["AttributeName"] in reqd_fields
-                    and f["AttributeType"] not in ("timestamp", "string")
-                )
-                dimension_fields = [
-                    f["AttributeName"] for f in tts_schema["Attributes"]
-                    if f["AttributeName"] not in (timestamp_field, target_field)
-                ]
-            # endif tts_schema is None: tts_schema has now been successfully inferred or error raised.
-
-            if renames is not None:
-                tts_chunk.rename(columns=renames, inplace=True)
-
-            if total_ranges is None:
-                total_ranges = pd.DataFrame()
-                for f in dimension_fields:
-                    total_ranges[f] = pd.Series([], dtype=tts_chunk[f].dtype)
-                total_ranges["starts"] = pd.Series([], dtype="datetime64[ns]")
-                total_ranges["ends"] = pd.Series([], dtype="datetime64[ns]")
-
-            # Update statistics from this chunk:
-            chunk_min_ts = tts_chunk[timestamp_field].min()
-            chunk_max_ts = tts_chunk[timestamp_field].max()
-            global_tts_start = chunk_min_ts if global_tts_start is None else min(
-                (global_tts_start, chunk_min_ts)
+                tts_schema["Attributes"].append(attribute)
+                attrs_by_type[schematype].append(attribute)
+            if header_columns is None:
+                # Try to infer column names from types, if missing:
+                if domain is None:
+                    # TODO: Infer from field type counts? Only works in very few cases
+                    raise NotImplementedError(
+                        "domain must be provided when tts_schema is not and source files have no headers"
+                    )
+                # For data types where there's exactly one matching field in the data and in the
+                # domain schema, we can infer correspondence.
+                required_specs = fcst.DOMAINS[domain].tts.required_fields
+                optional_specs = fcst.DOMAINS[domain].tts.optional_fields
+                for schematype, attributes in attrs_by_type.items():
+                    if len(attributes) > 1:
+                        raise ValueError(" ".join([
+                            "Cannot infer column names from domain and detected data types:",
+                            "{} (>1) fields in input have detected type '{}'".format(
+                                len(attributes),
+                                schematype,
+                            ),
+                        ]))
+                    else:  # Implicitly =1 as only detected types are present
+                        attribute = attributes[0]
+                        matching_required_fields = [
+                            f for f, spec in required_specs.items() if spec.AttributeType == schematype
+                        ]
+                        n_matching_required = len(matching_required_fields)
+                        if n_matching_required > 1:
+                            raise ValueError(" ".join((
+                                f"Domain {domain} requires {n_matching_required} fields of type",
+                                f"{schematype}, but data contains only one.",
+                            )))
+                        matching_optional_fields = [
+                            f for f, spec in optional_specs.items() if spec.AttributeType == schematype
+                        ]
+                        n_matching_optional = len(matching_optional_fields)
+                        if n_matching_required == 1:
+                            attribute["AttributeName"] = matching_required_fields[0]
+                        elif n_matching_required == 0 and n_matching_optional == 1:
+                            attribute["AttributeName"] = matching_optional_fields[0]
+            print(f"Inferred target time-series schema:\n{json.dumps(tts_schema, indent=2)}")
+            reqd_fields, optional_fields, custom_fields = validate_tts_schema_on_domain(
+                tts_schema,
+                domain,
+                is_tts_schema_explicit
             )
-            global_tts_end = chunk_max_ts if global_tts_end is None else max(
-                (global_tts_end, chunk_max_ts)
+            timestamp_field, target_field, dimension_fields = get_tts_field_roles(
+                tts_schema,
+                reqd_fields,
+                domain,
             )
-            total_records += len(tts_chunk)
-            total_records_nonulls += len(tts_chunk) - tts_chunk.isnull().any(axis=1).sum()
+        # endif tts_schema is None: tts_schema has now been successfully inferred or error raised.
+        tts_files.append((tts_filename, header_columns is not None))
 
-            chunk_nulls_by_field = tts_chunk.isna().sum()
-            num_nulls_by_field = chunk_nulls_by_field if num_nulls_by_field is None else (
-                num_nulls_by_field + chunk_nulls_by_field
-            )
-            for fname in dimension_fields:
-                chunk_unique_vals = tts_chunk[fname].value_counts(dropna=False)
-                if fname in unique_dimension_vals:
-                    unique_dimension_vals[fname] = unique_dimension_vals[fname].add(
-                        chunk_unique_vals,
-                        fill_value=0,  # Need to use this or we get NaN for combos not in the chunk
-                    ).astype(int)  # For some reason this add() converts to float by default
-                else:
-                    unique_dimension_vals[fname] = chunk_unique_vals
-            chunk_dimension_combos = tts_chunk.groupby(dimension_fields).size()
-            if unique_dimension_combos is None:
-                unique_dimension_combos = chunk_dimension_combos
-            else:
-                unique_dimension_combos = unique_dimension_combos.add(
-                    chunk_dimension_combos,
-                    fill_value=0,  # Need to use this or we get NaN for combos not in the chunk
-                ).astype(int)  # For some reason this add() converts to float by default
-
-            if frequency is not None:
-                # In this section, we'll construct/update the list of observed contiguous ranges.
-                freq_spec = fcst.FREQUENCIES[frequency]
-
-                # First map the raw timestamps to their bin locations, and calculate one step back:
-                binned_timestamps = bin_timestamps_to_frequency(tts_chunk[timestamp_field], frequency)
-                binned_timestamps.name = "binned_timestamps"
-                prev_timestamps = binned_timestamps - freq_spec["dt_offset"]
-                prev_timestamps.name = "prev_timestamps"
-
-                # Count the number of valid (non-blank target field) records in each bin, and update the
-                # metric for most records ever seen aggregated to a single bin:
-                record_counts = pd.concat(
-                    [binned_timestamps, tts_chunk[dimension_fields + [target_field]]],
-                    axis=1,
-                ).groupby(["binned_timestamps"] + dimension_fields).count()
-                record_counts = record_counts[record_counts[target_field] > 0]
-                max_chunk_aggregated_records = max(
-                    max_chunk_aggregated_records,
-                    record_counts[target_field].max()
-                )
+    # Analyze the files (in parallel, if there are several) and combine the results:
+    analyze_file = functools.partial(
+        diagnose_tts_file,
+        tts_schema=tts_schema,
+        timestamp_field=timestamp_field,
+        target_field=target_field,
+        dimension_fields=dimension_fields,
+        frequency=frequency,
+    )
+    if len(tts_files) > 1:
+        with ProcessPoolExecutor(max_workers=min(len(tts_files), os.cpu_count() or 1)) as executor:
+            file_stats = list(progress_bar(
+                executor.map(analyze_file, *zip(*tts_files)),
+                total=len(tts_files),
+                desc="TTS files",
+                unit="file",
+            ))
+    else:
+        file_stats = [analyze_file(*f, show_progress=True) for f in tts_files]
 
-                # Offset the index and self-join to calculate which bins don't have any data at the timestep
-                # directly preceding them, and therefore are the `start` of a contiguous run:
-                prev_count = record_counts.copy().rename(columns={ target_field: "prev" })
-                prev_count.index = prev_count.index.set_levels(
-                    prev_count.index.levels[0].shift(
-                        periods=freq_spec["dt_periods"],
-                        freq=freq_spec["dt_freq"]
-                    ),
-                    level=0,
-                )
-                starts = record_counts.join(prev_count)
-                starts = starts[starts["prev"].isna()].reset_index()[
-                    ["binned_timestamps"] + dimension_fields
-                ].rename(columns={ "binned_timestamps": "starts" })
-
-                # ...And do the same thing with opposite offset to find the `ends` of a contiguous run:
-                next_count = record_counts.copy().rename(columns={ target_field: "next" })
-                next_count.index = next_count.index.set_levels(
-                    next_count.index.levels[0].shift(
-                        periods=-1 * freq_spec["dt_periods"],
-                        freq=freq_spec["dt_freq"]
-                    ),
-                    level=0,
-                )
-                ends = record_counts.join(next_count)
-                ends = ends[ends["next"].isna()].reset_index()[
-                    ["binned_timestamps"] + dimension_fields
-                ].rename(columns={"binned_timestamps": "ends"})
-
-                # Merge the two together to describe the contiguous ranges in the dataset:
-                # Every start necessarily has a corresponding end, so it should be sufficient to join all
-                # end dates >= each start date and then just pick the earliest one - as we do here.
-                ranges = pd.merge(starts, ends, on=dimension_fields)
-                ranges = ranges[
-                    ranges["starts"] <= ranges["ends"]
-                ].groupby(dimension_fields + ["starts"]).min().reset_index()
-
-                # Because we're processing the data in chunks, we now need to take on the trickier task of
-                # *consolidating* these new detected time ranges with whatever we might have seen before. We
-                # don't want to encode any assumptions about how users have sharded up files or sorted their
-                # data - so we don't know much about hoow these new ranges might overlap with existing.
-                #
-                # We know that ranges should be consolidated when they're on *adjacent* timesteps (not just
-                # overlapping), so will start by calculating fields to join on for that and then appending
-                # the new ranges to the existing list:
-                ranges["prestarts"] = ranges["starts"] - freq_spec["dt_offset"]
-                ranges["postends"] = ranges["ends"] + freq_spec["dt_offset"]
-
-                total_ranges = total_ranges.append(ranges)
-
-                # Consolidating detected ranges is an iterative process because a consolidation could bring
-                # two previously separate ranges into overlap.
-                # TODO: Is there an upper bound on the # iterations required for combining two sane sets?
-                prev_n_ranges = float("inf")
-
-                # Pandas only supports equality joins, with inequality joins implemented via merge() and then
-                # filtering the result set. This is memory-inefficient for big chunk sizes we'd like to 
-                # process, so we'll use an in-mem SQLite connection to do the join in SQL instead.
-                with contextlib.closing(sqlite3.connect(":memory:")) as conn: # Auto-close when done
-                    # Could also consider using:
-                    # with conn: (to auto-commit transaction)
-                    # ...but we don't actually want the overhead of committing.
-                    while prev_n_ranges > len(total_ranges):
-                        prev_n_ranges = len(total_ranges)
-                        total_ranges.to_sql("total_ranges", conn, index=False)  # Export the table to SQLite
-                        consolidated = pd.read_sql_query(
-                            # Self-join on overlapping ranges and pick the furthest-apart start/end:
-                            f"""
-                                select distinct
-                                    { ", ".join(map(lambda dim: f"X.{dim}", dimension_fields)) },
-                                    X.starts as starts_x,
-                                    min(X.starts, Y.starts) as starts,
-                                    min(X.prestarts, Y.prestarts) as prestarts,
-                                    max(X.ends, Y.ends) as ends,
-                                    max(X.postends, Y.postends) as postends
-                                from
-                                    total_ranges X join total_ranges Y on
-                                    { " and ".join(map(lambda dim: f"X.{dim} = Y.{dim}", dimension_fields))}
-                                    and X.ends >= Y.prestarts
-                                    and X.starts <= Y.postends
-                                    and (X.starts >= Y.starts or X.ends <= Y.ends)
-                            """,
-                            conn,
-                        )
-                        # Restore the pandas field types from SQLite import:
-                        for field in ["starts_x", "starts", "prestarts", "ends", "postends"]:
-                            consolidated[field] = pd.to_datetime(consolidated[field])
-                        for field in dimension_fields:
-                            consolidated[field] = consolidated[field].astype(total_ranges[field].dtype)
-
-                        # Clear out the SQLLite table for next loop
-                        with contextlib.closing(conn.cursor()) as cursor: # auto-closes
-                            cursor.execute("drop table total_ranges")#
-
-                        # The above join isn't sufficient by itself, because the self-join path allows
-                        # redundant ranges through. So we also summarize by left start date and drop
-                        # duplicates, to clear those out:
-                        # TODO: Move entirely into SQL for more efficient execution planning?
-                        consolidated = consolidated.groupby(dimension_fields + ["starts_x"]).agg({
-                            "starts": "min",
-                            "prestarts": "min",
-                            "ends": "max",
-                            "postends": "max",
-                        }).reset_index()
-                        total_ranges = consolidated[
-                            dimension_fields + ["starts", "prestarts", "ends", "postends"]
-                        ].drop_duplicates()
-                    # endwhile prev_n_ranges > len(total_ranges):
-                # endwith sqllite connection
-            # endif frequency is not None:
-        # endfor tts_chunk in tts_chunker
-    # endfor tts_filename in tts_filenames
+    n_chunks_global = 0  # Total number of batches across all files
+    global_tts_start = None
+    global_tts_end = None
+    total_records = 0
+    total_records_nonulls = 0
+    num_nulls_by_field = np.zeros(len(tts_schema["Attributes"]), dtype=np.int64)
+    unique_dimension_vals = {f: CategoryCounter([f], dropna=False) for f in dimension_fields}
+    unique_dimension_combos = CategoryCounter(dimension_fields)
+    # The most records we've ever seen aggregated/mapped to a timestep-[dimensions] bucket (which is a
+    # lower bound, because we only see the contents of one chunk at a time):
+    max_chunk_aggregated_records = 0
+    for stats in file_stats:
+        n_chunks_global += stats.n_chunks
+        if stats.tts_start is not None:
+            global_tts_start = stats.tts_start if global_tts_start is None else min(
+                (global_tts_start, stats.tts_start)
+            )
+            global_tts_end = stats.tts_end if global_tts_end is None else max(
+                (global_tts_end, stats.tts_end)
+            )
+        total_records += stats.n_records
+        total_records_nonulls += stats.n_records_nonulls
+        num_nulls_by_field += stats.num_nulls_by_field
+        for fname in dimension_fields:
+            unique_dimension_vals[fname].merge(stats.unique_dimension_vals[fname])
+        unique_dimension_combos.merge(stats.unique_dimension_combos)
+        max_chunk_aggregated_records = max(max_chunk_aggregated_records, stats.max_aggregated_records)
+    if frequency is not None:
+        freq_spec = fcst.FREQUENCIES[frequency]
+        if len(file_stats) > 1:
+            # Ranges from different files may still overlap or be adjacent:
+            total_ranges = consolidate_ranges(
+                pd.concat([stats.total_ranges for stats in file_stats], ignore_index=True),
+                dimension_fields,
+            )
+        else:
+            total_ranges = file_stats[0].total_ranges
 
     # Processing loop finished - report generation starts here:
+    unique_dimension_vals = {f: counter.to_series() for f, counter in unique_dimension_vals.items()}
+    if len(dimension_fields) == 1:
+        # Item counts are the one dimension's value counts, but excluding missing values (like groupby):
+        unique_dimension_combos = unique_dimension_vals[dimension_fields[0]]
+        unique_dimension_combos = unique_dimension_combos[unique_dimension_combos.index.notna()]
+    else:
+        unique_dimension_combos = unique_dimension_combos.to_series()
 
     # Some useful pre-report setup:
+    global_tts_start = pd.Timestamp(global_tts_start)
+    global_tts_end = pd.Timestamp(global_tts_end)
     if frequency is not None:
-        # global timestamps are strings only because they can be tracked even when frequency
-        # is not provided, so we'll use the same method as for later sections to calculate steps:
         # TODO: Off by one, the .n + 1 is not a sufficient fix
-        globallims = pd.to_datetime(
-            pd.Series([global_tts_start, global_tts_end])
-        ).dt.to_period(frequency)
+        globallims = pd.Series([global_tts_start, global_tts_end]).dt.to_period(frequency)
         global_steps = math.ceil(((globallims[1] - globallims[0]).n + 1) / freq_spec["dt_periods"])
     else:
         global_steps = None
@@ -745,7 +1171,10 @@ def diagnose(
         display(notebook.generate_warnbox(
             f"{n_missing} ({100*n_missing/total_records:.2f}% of total) records contain missing values"
         ))
-        display(pd.DataFrame({ "Missing/Empty Values": num_nulls_by_field }))
+        display(pd.DataFrame(
+            { "Missing/Empty Values": num_nulls_by_field },
+            index=[f["AttributeName"] for f in tts_schema["Attributes"]],
+        ))
 
     # Top-level analysis of items in the forecast (item_id and whatever other dimensions):
     display(Markdown("\n".join((
@@ -782,11 +1211,13 @@ def diagnose(
             ))
     # TODO: Only output the values per dim if multiple dimensions
     for fname in unique_dimension_vals:
+        # (CategoryCounter results are sorted by value, so re-sort by descending count like value_counts())
+        dimension_vals_sorted = unique_dimension_vals[fname].sort_values(ascending=False)
         display(Markdown(f"**Unique values in dimension '{fname}'**: {len(unique_dimension_vals[fname])}"))
         display(Markdown(f"**Top record counts by dimension {fname}:**"))
-        display(add_pct_to_value_counts(unique_dimension_vals[fname], clip=10))
+        display(add_pct_to_value_counts(dimension_vals_sorted, clip=10))
         plot_loglog(
-            unique_dimension_vals[fname].sort_values(ascending=False),
+            dimension_vals_sorted,
             quantity="record count",
             instance_units=f"{fname}s",
         )
@@ -1,22 +1,85 @@
 # Python Built-Ins:
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import gzip
+import itertools
 import json
+import os
 import re
+import shutil
 import time
 from types import SimpleNamespace
-from typing import Union
+from typing import Iterable, Union
 
 # External Dependencies:
 import boto3
 import botocore.exceptions
+from IPython.display import display
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+try:
+    from isal import igzip  # ISA-L accelerated drop-in replacement for gzip, if installed
+except ImportError:
+    igzip = gzip
+
+try:
+    import rapidgzip  # Parallel gzip decompression for large archives, if installed
+except ImportError:
+    rapidgzip = None
+
+try:
+    # orjson parses large JSON (e.g. saved forecast query results) several times faster than stdlib:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import ijson  # Streaming JSON parser for extracting values from large files, if installed
+except ImportError:
+    ijson = None
+
+try:
+    import pyarrow  # Enables pandas' multi-threaded engine="pyarrow" CSV parser, if installed
+except ImportError:
+    pyarrow = None
+
 # Local Dependencies:
 from . import notebook_utils as notebook
 
+
+# Valid SchemaAttribute AttributeName pattern (anchored at both ends) and AttributeTypes:
+ATTRIBUTE_NAME_REGEX = re.compile(r"\A[a-zA-Z][a-zA-Z0-9_]*\Z")
+ATTRIBUTE_TYPES = frozenset(("string", "integer", "float", "timestamp"))
+# Types to read each AttributeType as in pandas:
+ATTRIBUTE_NUMPY_TYPES = {
+    "string": str,
+    "timestamp": str,
+    "integer": "Int64",
+    "float": np.float64,
+}
+GZIP_READ_BUFFER_SIZE = 128 * 1024  # Chunk size for streaming decompression in extract_gz
+PARALLEL_GZIP_MIN_BYTES = 64 * 1024 * 1024  # Compressed size above which extract_gz uses rapidgzip, if available
+# Trust policy allowing Amazon Forecast to assume the role created by get_or_create_role_arn:
+FORECAST_ASSUME_ROLE_POLICY_JSON = json.dumps({
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": {
+                "Service": "forecast.amazonaws.com"
+            },
+            "Action": "sts:AssumeRole"
+        }
+    ]
+})
+WAIT_INITIAL_SECONDS = 1  # First poll interval in wait(), growing by WAIT_BACKOFF_FACTOR up to its time_interval
+WAIT_BACKOFF_FACTOR = 1.5
+IAM_PROPAGATION_SECONDS = 60  # Wait after creating an IAM role, before it can reliably be used by Forecast
+
+
 class SchemaAttribute:
     """SchemaAttribute object corresponding to Amazon Forecast API, with validation methods
 
@@ -38,20 +101,15 @@ class SchemaAttribute:
 
     @staticmethod
     def is_valid_name(name: str) -> bool:
-        return bool(re.match(r"[a-zA-Z][a-zA-Z0-9_]*", name))
+        return ATTRIBUTE_NAME_REGEX.match(name) is not None
 
     @staticmethod
     def is_valid_type(typename: str) -> bool:
-        return typename in ("string", "integer", "float", "timestamp")
+        return typename in ATTRIBUTE_TYPES
 
     @staticmethod
     def type_to_numpy_type(typename: str):
-        if typename in ("string", "timestamp"):
-            return str
-        elif typename == "integer":
-            return "Int64"
-        elif typename == "float":
-            return np.float64
+        return ATTRIBUTE_NUMPY_TYPES.get(typename)
 
 
 # Reference structure of domains supported by Forecast (for validation checks, etc).
@@ -246,63 +304,81 @@ def wait_till_delete(callback, check_time = 5, timeout = None):
 def wait(callback, time_interval = 10):
     status_indicator = notebook.StatusIndicator()
 
+    # Poll quickly at first so short jobs return promptly, backing off to every time_interval seconds:
+    delay = min(WAIT_INITIAL_SECONDS, time_interval)
     while True:
         status = callback()['Status']
         status_indicator.update(status)
         if status in ('ACTIVE', 'CREATE_FAILED'): break
-        time.sleep(time_interval)
+        time.sleep(delay)
+        delay = min(delay * WAIT_BACKOFF_FACTOR, time_interval)
 
     status_indicator.end()
     
     return (status=="ACTIVE")
 
 
+@functools.lru_cache(maxsize=4)
+def load_exact_sol_by_item(fname, is_schema_perm=False):
+    """Parse an exact solution CSV into {item_id: DataFrame} (cached, so repeated per-item loads are cheap)
+
+    Returns a tuple of the dict, and an empty DataFrame with the same columns (for missing items)
+    """
+    exact = pd.read_csv(
+        fname,
+        header = None,
+        names = ['timestamp', 'target', 'item_id'] if is_schema_perm else ['item_id', 'timestamp', 'target'],
+        # Keep timestamps as strings: the pyarrow engine would otherwise parse them, but the C engine wouldn't
+        dtype = {'timestamp': str},
+        engine = "pyarrow" if pyarrow else "c",
+    )
+    return dict(tuple(exact.groupby('item_id', sort=False))), exact.iloc[:0]
+
+
 def load_exact_sol(fname, item_id, is_schema_perm=False):
-    exact = pd.read_csv(fname, header = None)
-    exact.columns = ['item_id', 'timestamp', 'target']
-    if is_schema_perm:
-        exact.columns = ['timestamp', 'target', 'item_id']
-    return exact.loc[exact['item_id'] == item_id]
+    exact_by_item, empty = load_exact_sol_by_item(fname, is_schema_perm)
+    # Copy so callers can't modify the cached data:
+    return exact_by_item.get(item_id, empty).copy()
+
+
+@functools.lru_cache(maxsize=None)
+def get_boto_client(service_name: str, boto_session=None):
+    """Get a (cached, so reused across calls) boto3 client for service_name from boto_session or the default
+
+    Reusing clients avoids repeating client construction and keeps their HTTPS connection pools warm.
+    """
+    return (boto_session if boto_session else boto3).client(service_name)
 
 
 def get_or_create_role_arn(boto_session=None):
-    iam = (boto_session if boto_session else boto3).resource("iam")
+    iam = get_boto_client("iam", boto_session)
     role_name = "ForecastRoleDemo"
-    assume_role_policy_document = {
-        "Version": "2012-10-17",
-        "Statement": [
-            {
-              "Effect": "Allow",
-              "Principal": {
-                "Service": "forecast.amazonaws.com"
-              },
-              "Action": "sts:AssumeRole"
-            }
-        ]
-    }
     role_arn = None
     need_sleep = False
     try:
         create_role_response = iam.create_role(
             RoleName=role_name,
-            AssumeRolePolicyDocument=json.dumps(assume_role_policy_document),
+            AssumeRolePolicyDocument=FORECAST_ASSUME_ROLE_POLICY_JSON,
         )
         need_sleep = True
         role_arn = create_role_response["Role"]["Arn"]
     except iam.exceptions.EntityAlreadyExistsException:
         print("The role " + role_name + " exists, ignore to create it")
-        role_arn = iam.Role(role_name).arn
-    policy_arn = "arn:aws:iam::aws:policy/AmazonForecastFullAccess"
-    iam.attach_role_policy(
-        RoleName = role_name,
-        PolicyArn = policy_arn
-    )
-    iam.attach_role_policy(
-        PolicyArn='arn:aws:iam::aws:policy/AmazonS3FullAccess',
-        RoleName=role_name
+        role_arn = iam.get_role(RoleName=role_name)["Role"]["Arn"]
+    policy_arns = (
+        "arn:aws:iam::aws:policy/AmazonForecastFullAccess",
+        "arn:aws:iam::aws:policy/AmazonS3FullAccess",
     )
+    # The policy attachments are independent API round-trips, so make them concurrently:
+    with ThreadPoolExecutor(max_workers=len(policy_arns)) as executor:
+        list(executor.map(
+            lambda policy_arn: iam.attach_role_policy(RoleName=role_name, PolicyArn=policy_arn),
+            policy_arns,
+        ))
     if need_sleep:
-        time.sleep(60) # wait for a minute to allow IAM role policy attachment to propagate
+        # IAM changes take time to reach other services, and no API reports when Forecast can assume the
+        # new role - so wait conservatively to allow the role and its policy attachments to propagate:
+        time.sleep(IAM_PROPAGATION_SECONDS)
     print(role_arn)
     return role_arn
 
@@ -329,32 +405,91 @@ def get_or_create_role_arn(boto_session=None):
 def extract_gz( src, dst ):
     print( f"Extracting {src} to {dst}" )    
 
-    with open(dst, 'wb') as fd_dst:
-        with gzip.GzipFile( src, 'rb') as fd_src:
-            data = fd_src.read()
-            fd_dst.write(data)
+    # Large archives decompress much faster across all cores with rapidgzip; otherwise igzip/gzip:
+    if rapidgzip is not None and os.path.getsize(src) >= PARALLEL_GZIP_MIN_BYTES:
+        open_src = functools.partial(rapidgzip.open, src, parallelization=os.cpu_count())
+    else:
+        open_src = functools.partial(igzip.open, src, 'rb')
+    # Stream through a fixed-size buffer rather than holding the whole decompressed file in memory:
+    with open_src() as fd_src, open(dst, 'wb') as fd_dst:
+        shutil.copyfileobj(fd_src, fd_dst, length=GZIP_READ_BUFFER_SIZE)
 
     print("Done.")
 
 def extract_json_values(obj, key):
-    """Pull all values of specified key from nested JSON."""
+    """Pull all values of specified key from nested JSON.
+
+    `obj` should be already-parsed JSON: use `json_loads` from this module (orjson-accelerated if available)
+    if loading from a string or file.
+    """
     arr = []
+    nokey = object()  # Placeholder "key" for list items, which can never match
+
+    # Depth-first walk with an explicit stack of (key, value) iterators instead of recursion, to avoid
+    # per-level call overhead and RecursionError on deep trees while keeping document order of results:
+    stack = [iter(((nokey, obj),))]
+    while stack:
+        for k, v in stack[-1]:
+            if isinstance(v, dict):
+                stack.append(iter(v.items()))
+                break
+            elif isinstance(v, list):
+                stack.append(zip(itertools.repeat(nokey), v))
+                break
+            elif k == key:
+                arr.append(v)
+        else:
+            stack.pop()
+    return arr
+
 
-    def extract(obj, arr, key):
-        """Recursively search for values of key in JSON tree."""
-        if isinstance(obj, dict):
-            for k, v in obj.items():
-                if isinstance(v, (dict, list)):
-                    extract(v, arr, key)
-                elif k == key:
-                    arr.append(v)
-        elif isinstance(obj, list):
-            for item in obj:
-                extract(item, arr, key)
-        return arr
+def iter_json_values(json_file, key):
+    """Stream all (non-object, non-array) values of specified key from a JSON file, in document order.
 
-    results = extract(obj, arr, key)
-    return results
+    Equivalent to `extract_json_values(json_loads(...), key)` but, when ijson is installed, parses
+    incrementally instead of loading the whole JSON tree into memory.
+
+    Parameters
+    ----------
+    json_file :
+        Path to a JSON file, or an already-open binary file object.
+    key : str
+        Key to search for at any level of the JSON.
+    """
+    if isinstance(json_file, str):
+        with open(json_file, "rb") as f:
+            yield from iter_json_values(f, key)
+        return
+
+    if ijson is None:
+        yield from extract_json_values(json_loads(json_file.read()), key)
+        return
+
+    is_key_match = False
+    for _, event, value in ijson.parse(json_file, use_float=True):
+        if is_key_match and event not in ("start_map", "start_array"):
+            yield value
+        is_key_match = event == "map_key" and value == key
+
+
+def forecast_to_arrays(response: dict) -> dict:
+    """Convert a Forecast QueryForecast response's predictions to float64 numpy arrays by quantile
+
+    Parameters
+    ----------
+    response : dict
+        Response from forecastquery.query_forecast(), with `Forecast.Predictions` mapping each quantile
+        (e.g. `p10`, `p50`, `p90`) to a list of {"Timestamp", "Value"} points.
+
+    Returns
+    -------
+    arrays : dict
+        {quantile: np.ndarray} of point values, ready to use as columns of a `plot_forecasts` DataFrame.
+    """
+    return {
+        quantile: np.fromiter((p["Value"] for p in points), dtype=np.float64, count=len(points))
+        for quantile, points in response["Forecast"]["Predictions"].items()
+    }
 
 
 def plot_forecasts(
@@ -362,6 +497,7 @@ def plot_forecasts(
     actuals: Union[pd.DataFrame, None]=None,
     xlabel: str="Date",
     ylabel: str="Value",
+    item_ids: Union[Iterable, None]=None,
 ):
     """Plot 10/50/90 quantile forecast(s) with optional actual data overlay
 
@@ -374,83 +510,114 @@ def plot_forecasts(
     actuals : pandas.DataFrame (Optional)
         Must be indexed by date/timestamp and include `actual` column. Presence or absence of `item_id`
         column match `forecast` argument.
+    item_ids : Iterable (Optional)
+        Specific item_id(s) to plot, in order. By default, all items are plotted in order of appearance:
+        providing these when only a few items are needed avoids grouping every row of large inputs.
     """
 
-    item_ids = forecasts["item_id"].unique() if "item_id" in forecasts else [None]
+    def get_rows_by_item(df: pd.DataFrame) -> dict:
+        """Map each item_id to its row positions in df (or a whole-frame slice if there's no item_id)"""
+        if "item_id" not in df:
+            return {None: slice(None)}
+        elif item_ids is None:
+            # Group rows once (in order of first appearance), instead of filtering per item:
+            return df.groupby("item_id", sort=False).indices
+        else:
+            df_item_ids = df["item_id"].to_numpy()
+            return {item_id: np.flatnonzero(df_item_ids == item_id) for item_id in item_ids}
+
+    forecast_rows_by_item = get_rows_by_item(forecasts)
+    if actuals is not None:
+        actual_rows_by_item = get_rows_by_item(actuals)
+
+    # Convert timestamps to matplotlib date numbers once up front (from a datetime64 array, which date2num
+    # handles vectorized), rather than for every item:
+    all_forecast_tsnums = mpl.dates.date2num(forecasts.index.to_numpy(dtype="datetime64[ns]"))
+    if actuals is not None:
+        all_actual_tsnums = mpl.dates.date2num(actuals.index.to_numpy(dtype="datetime64[ns]"))
+
+    # Likewise extract all plotted values as float64 arrays once, so matplotlib receives plain ndarrays
+    # rather than re-converting Series on each call (and items needn't be sliced as DataFrames):
+    extra_quantile_fields = [
+        f for f in forecasts.columns if re.match(r"p\d\d", f) and f not in ("p10", "p50", "p90")
+    ]
+    all_forecast_values = {
+        field: forecasts[field].to_numpy(dtype=np.float64, na_value=np.nan)
+        for field in ("p10", "p50", "p90", "mean", *extra_quantile_fields) if field in forecasts
+    }
+    if actuals is not None:
+        all_actual_values = actuals["actual"].to_numpy(dtype=np.float64, na_value=np.nan)
 
-    for item_id in item_ids:
-        forecast = forecasts if item_id is None else forecasts[forecasts["item_id"] == item_id]
-        forecast_tsnums = mpl.dates.date2num(forecast.index)
+    for item_id, forecast_rows in forecast_rows_by_item.items():
+        forecast_tsnums = all_forecast_tsnums[forecast_rows]
+        values = {field: arr[forecast_rows] for field, arr in all_forecast_values.items()}
 
         # Create our figure:
         fig = plt.figure(figsize=(15, 5))
         ax = plt.gca()
         ax.set_title(f"Item {item_id}")
 
-        if "p10" in forecast and "p90" in forecast:
+        if "p10" in values and "p90" in values:
             # Translucent color-1 fill covering the confidence interval:
             ax.fill_between(
                 forecast_tsnums,
-                forecast["p10"],
-                forecast["p90"],
+                values["p10"],
+                values["p90"],
                 alpha=0.3,
                 label="80% Confidence Interval",
             )
-        elif "p10" in forecast or "p90" in forecast:
-            islower = "p10" in forecast
+        elif "p10" in values or "p90" in values:
+            islower = "p10" in values
             quantile = "p10" if islower else "p90"
-            anchor = "p50" if "p50" in forecast else "mean" if "mean" in forecast else None
+            anchor = "p50" if "p50" in values else "mean" if "mean" in values else None
             if anchor is not None:
                 ax.fill_between(
                     forecast_tsnums,
-                    forecast[quantile if islower else anchor],
-                    forecast[anchor if islower else quantile],
+                    values[quantile if islower else anchor],
+                    values[anchor if islower else quantile],
                     alpha=0.3,
                     label=f"{quantile if islower else anchor}-{anchor if islower else quantile} Interval",
                 )
             else:
                 ax.plot_date(
                     forecast_tsnums,
-                    forecast[quantile],
+                    values[quantile],
                     fmt="-",
-                    label=f"{field} Quantile",
+                    label=f"{quantile} Quantile",
                 )
 
         if actuals is not None:
             # A black line plot of the actuals (training + test):
-            actual = actuals if item_id is None else actuals[actuals["item_id"] == item_id]
+            actual_rows = actual_rows_by_item.get(item_id, [])
             ax.plot_date(
-                mpl.dates.date2num(actual.index),
-                actual["actual"],
+                all_actual_tsnums[actual_rows],
+                all_actual_values[actual_rows],
                 fmt="-",
                 color="black",
                 label="Actual",
             )
 
-        if "p50" in forecast:
+        if "p50" in values:
             # Color-1 line identifying the prediction median:
             ax.plot_date(
                 forecast_tsnums,
-                forecast["p50"],
+                values["p50"],
                 fmt="-",
                 label="Prediction Median",
             )
-        if "mean" in forecast:
+        if "mean" in values:
             # Color-2 line identifying the prediction mean:
             ax.plot_date(
                 forecast_tsnums,
-                forecast["mean"],
+                values["mean"],
                 fmt="-",
                 label="Prediction Mean",
             )
 
-        for field in filter(
-            lambda f: re.match(r"p\d\d", f) and f not in ("p10", "p50", "p90"),
-            forecast.columns
-        ):
+        for field in extra_quantile_fields:
             ax.plot_date(
                 forecast_tsnums,
-                forecast[field],
+                values[field],
                 fmt="--",
                 label=f"{field} Quantile",
             )
@@ -458,4 +625,7 @@ def plot_forecasts(
         ax.set_xlabel(xlabel)
         ax.set_ylabel(ylabel)
         ax.legend()
-        plt.show()
+        # Render this item's figure and release it straight away, rather than letting figures accumulate
+        # for an interactive plt.show() per item:
+        display(fig)
+        plt.close(fig)
@@ -12,9 +12,8 @@ import pandas as pd
 widget_table = {}
 
 def create_text_widget( name, placeholder, default_value="" ):
-    if name in widget_table:
-        widget = widget_table[name]
-    if name not in widget_table:
+    widget = widget_table.get(name)
+    if widget is None:
         widget = ipywidgets.Text( description = name, placeholder = placeholder, value=default_value )
         widget_table[name] = widget
     display(widget)
@@ -62,12 +61,10 @@ class StatusIndicator:
     def __init__(self):
         self.previous_status = None
         self.need_newline = False
-        
+
     def update( self, status ):
         if self.previous_status != status:
-            if self.need_newline:
-                sys.stdout.write("\n")
-            sys.stdout.write( status + " ")
+            sys.stdout.write(("\n" if self.need_newline else "") + status + " ")
             self.need_newline = True
             self.previous_status = status
         else: